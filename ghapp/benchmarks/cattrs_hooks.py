@@ -0,0 +1,128 @@
+"""Structure and unstructure throughput of generated vs wrapping cattrs hooks.
+
+Compares the generated `ghapp.cattrs` hooks with the previous wrapping hooks,
+which copy and filter input dicts before structuring and delete `None`
+optionals after unstructuring, on the webhook and check run hot paths:
+structuring the bundled `buildkite.job.*.json` fixtures as `JobHook`, and
+structuring and unstructuring a `GetRuns` page of `RunDetails`.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.cattrs_hooks [--number N]
+"""
+from typing import List
+
+import argparse
+import glob
+import json
+import os
+import timeit
+
+import cattr
+
+from ghapp.cattrs import (
+    ignore_optional_none, ignore_unknown_attribs, maybe_parse_bool)
+from ghapp.buildkite import jobs
+from ghapp.github import checks
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "../ghapp/tests")
+
+CLASSES = [
+    jobs.Job, jobs.Build, jobs.Pipeline, jobs.JobHook,
+    checks.Annotation, checks.Output, checks.RunDetails,
+]
+
+
+def converter(wrapping: bool) -> cattr.Converter:
+    conv = cattr.Converter()
+    conv.register_structure_hook(bool, maybe_parse_bool)
+
+    for cls in CLASSES:
+        if wrapping:
+            # Non-default hooks are wrapped rather than generated
+            conv.register_structure_hook(
+                cls, lambda obj, cl: conv.structure_attrs_fromdict(obj, cl))
+            conv.register_unstructure_hook(
+                cls, lambda obj: conv.unstructure_attrs_asdict(obj))
+
+        ignore_unknown_attribs(cls, converter=conv)
+        ignore_optional_none(cls, converter=conv)
+
+    return conv
+
+
+def runs_page(n: int) -> dict:
+    """A check run listing page, with fields RunDetails ignores."""
+    return {
+        "total_count": n,
+        "check_runs": [
+            {
+                "id": 1000 + i,
+                "name": f"job {i}",
+                "head_sha": "a" * 40,
+                "external_id": f"job-{i}",
+                "status": "completed",
+                "conclusion": "success",
+                "started_at": "2018-06-14T09:58:12Z",
+                "completed_at": "2018-06-14T10:08:12Z",
+                "details_url": f"https://buildkite.com/o/r/builds/1#job-{i}",
+                "url": f"https://api.github.com/repos/o/r/check-runs/{1000 + i}",
+                "html_url": f"https://github.com/o/r/runs/{1000 + i}",
+                "output": {
+                    "title": f"job {i}",
+                    "summary": "passed",
+                    "text": None,
+                    "annotations_count": 0,
+                    "annotations_url": "https://api.github.com/...",
+                },
+                "check_suite": {"id": 1},
+                "app": {"id": 1, "name": "ghapp"},
+                "pull_requests": [],
+            } for i in range(n)
+        ],
+    }
+
+
+def report(name, funcs, number):
+    rates = {}
+    for kind, func in funcs.items():
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        rates[kind] = number / elapsed
+
+    print(f"{name:<46} " + "  ".join(
+        f"{kind} {rate:>10.1f}/s" for kind, rate in rates.items()) +
+        f"  x{rates['generated'] / rates['wrapping']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    convs = dict(wrapping=converter(True), generated=converter(False))
+
+    def compare(name, func, number):
+        results = {kind: func(conv) for kind, conv in convs.items()}
+        assert results["wrapping"] == results["generated"], name
+        report(name,
+               {kind: (lambda c=conv: func(c)) for kind, conv in convs.items()},
+               number)
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "buildkite.job.*.json"))):
+        with open(path) as inf:
+            body = json.load(inf)
+        compare(f"structure JobHook {os.path.basename(path)}",
+                lambda c: c.structure(body, jobs.JobHook), args.number)
+
+    page = runs_page(100)["check_runs"]
+    compare("structure 100 RunDetails",
+            lambda c: c.structure(page, List[checks.RunDetails]),
+            args.number // 100)
+
+    runs = convs["generated"].structure(page, List[checks.RunDetails])
+    compare("unstructure 100 RunDetails",
+            lambda c: c.unstructure(runs), args.number // 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Startup cost of `ghapp` cli subcommands.
+
+Runs each subcommand in a fresh interpreter, reporting best-of wall time,
+total import time as reported by `python -X importtime` (python 3.7+) and
+the slowest imports. Subcommands are invoked offline, eg. `credential get`
+for a non-github host, so only startup and import costs are measured.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.cli_startup [--repeat N] [--max_ms MS]
+
+With `--max_ms` exits non-zero if any subcommand exceeds the given wall time,
+for use as a hook latency regression check.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+NON_GITHUB_CREDENTIAL = "host=example.com\nprotocol=https\npath=test/repo\n"
+
+SUBCOMMANDS = [
+    (["--help"], ""),
+    (["credential", "store"], ""),
+    (["credential", "erase"], NON_GITHUB_CREDENTIAL),
+    (["credential", "get"], NON_GITHUB_CREDENTIAL),
+    (["check", "from-job-env", "--help"], ""),
+]
+
+RUNNER = """
+import sys
+from ghapp.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+"""
+
+
+def run(argv, stdin):
+    env = dict(
+        os.environ,
+        LC_ALL="C.UTF-8",
+        LANG="C.UTF-8",
+        GITHUB_APP_AUTH_ID="1",
+        GITHUB_APP_AUTH_KEY="BEGIN RSA PRIVATE KEY",
+    )
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER] + argv,
+        input=stdin.encode(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+
+    imports = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    return wall, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--max_ms", type=float, default=None)
+    args = parser.parse_args()
+
+    slow = []
+    for argv, stdin in SUBCOMMANDS:
+        runs = [run(argv, stdin) for _ in range(args.repeat)]
+        wall, imports = min(runs, key=lambda r: r[0])
+        wall_ms = wall * 1e3
+
+        import_ms = sum(i[0] for i in imports) / 1e3
+        print(f"ghapp {' '.join(argv):<32} wall: {wall_ms:7.1f}ms"
+              f"  imports: {import_ms:7.1f}ms ({len(imports)} modules)")
+
+        toplevel = [i for i in imports if i[2] == 0]
+        for _, cumulative_us, _, name in sorted(toplevel, reverse=True,
+                                                key=lambda i: i[1])[:args.top]:
+            print(f"    {name:<36} {cumulative_us / 1e3:7.1f}ms")
+
+        if args.max_ms is not None and wall_ms > args.max_ms:
+            slow.append(argv)
+
+    if slow:
+        print(f"Exceeded {args.max_ms}ms: {slow}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""End-to-end `check from-job-env` latency and api usage per job.
+
+Runs the pre-command and post-command hook operations for a number of jobs
+against a local fake github api (`ghapp.tests.fakegithub`) with injected
+latency and error rates, reporting hook wall time percentiles and api calls
+per job by route.
+
+In `cli` mode each hook uses a fresh session and app identity, as a hook
+invoking `ghapp` does, while in `daemon` mode they are shared across hooks,
+as with `ghapp daemon`.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.from_job_env [--jobs N] [--latency S] \\
+        [--error_rate R] [--mode cli|daemon]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from ghapp import operations
+from ghapp.github.etagcache import ETagCache
+from ghapp.github.identity import AppIdentity
+from ghapp.github.retry import RetryPolicy
+from ghapp.github.urls import API_URL_ENV_VAR
+from ghapp.tests.fakegithub import FakeGithub
+
+from .jwt_signing import generate_key
+
+
+def job_environ(job: int, checkout_root: str) -> dict:
+    return dict(
+        CI="true",
+        BUILDKITE="true",
+        BUILDKITE_LABEL=f"job {job}",
+        BUILDKITE_BRANCH="master",
+        BUILDKITE_COMMIT="abc",
+        BUILDKITE_REPO="https://github.com/o/r.git",
+        BUILDKITE_BUILD_ID="build-1",
+        BUILDKITE_BUILD_NUMBER="1",
+        BUILDKITE_BUILD_URL="https://buildkite.com/o/r/builds/1",
+        BUILDKITE_JOB_ID=f"job-{job}",
+        BUILDKITE_COMMAND="true",
+        BUILDKITE_TIMEOUT="false",
+        BUILDKITE_BUILD_CHECKOUT_PATH=os.path.join(
+            checkout_root, f"job-{job}", "r"),
+    )
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def run(args):
+    github = FakeGithub(
+        latency=args.latency, error_rate=args.error_rate, seed=0)
+    runner = web.AppRunner(github.application())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    os.environ[API_URL_ENV_VAR] = f"http://127.0.0.1:{port}"
+
+    pem = generate_key()
+    retry = RetryPolicy(base_delay=0.01)
+
+    shared_identity = AppIdentity(app_id=1, private_key=pem)
+    shared_session = aiohttp.ClientSession()
+    shared_cache = ETagCache()
+
+    timings = {"pre": [], "post": []}
+    failures = 0
+
+    async def hook(name, environ):
+        nonlocal failures
+
+        if args.mode == "daemon":
+            identity, session, cache = (
+                shared_identity, shared_session, shared_cache)
+        else:
+            identity = AppIdentity(app_id=1, private_key=pem)
+            session = aiohttp.ClientSession()
+            cache = None
+
+        start = time.perf_counter()
+        try:
+            await operations.check_from_job_env(
+                identity, session, environ, retry=retry, cache=cache)
+        except Exception:
+            failures += 1
+        finally:
+            timings[name].append(time.perf_counter() - start)
+            if session is not shared_session:
+                await session.close()
+
+    with tempfile.TemporaryDirectory() as checkout_root:
+        for job in range(args.jobs):
+            environ = job_environ(job, checkout_root)
+            await hook("pre", environ)
+            await hook("post", dict(environ, BUILDKITE_COMMAND_EXIT_STATUS="0"))
+
+    await shared_session.close()
+    await runner.cleanup()
+
+    print(f"mode={args.mode} jobs={args.jobs} latency={args.latency}s "
+          f"error_rate={args.error_rate} failures={failures}")
+    for name, values in timings.items():
+        print(f"{name:<6} p50 {percentile(values, 0.5) * 1000:>8.1f} ms"
+              f"  p95 {percentile(values, 0.95) * 1000:>8.1f} ms"
+              f"  mean {statistics.mean(values) * 1000:>8.1f} ms")
+
+    print(f"api calls per job: {github.total_calls / args.jobs:.2f}")
+    for route, count in sorted(github.calls.items()):
+        print(f"  {route:<20} {count / args.jobs:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Injected api latency in seconds.")
+    parser.add_argument("--error_rate", type=float, default=0,
+                        help="Fraction of api requests failing with 502.")
+    parser.add_argument("--mode", choices=["cli", "daemon"], default="cli")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Webhook payload decode and encode throughput of installed json codecs.
+
+Decodes and re-encodes the bundled `buildkite.job.*.json` and ping fixtures
+with each codec of `ghapp.jsoncodec` available in the environment, eg. after
+`pip install orjson ujson`.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.json_codec [--number N]
+"""
+import argparse
+import glob
+import os
+import timeit
+
+from ghapp import jsoncodec
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "../ghapp/tests")
+
+
+def report(name, func, number, nbytes):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print(f"  {name:<14}{number / elapsed:>12.1f} payloads/s"
+          f" {number * nbytes / elapsed / 1e6:>10.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    fixtures = sorted(
+        glob.glob(os.path.join(FIXTURES, "buildkite.job.*.json")) +
+        glob.glob(os.path.join(FIXTURES, "*.ping.json")))
+    codecs = jsoncodec.available()
+    print("codecs:", ", ".join(c.name for c in codecs))
+
+    for path in fixtures:
+        with open(path, "rb") as inf:
+            raw = inf.read()
+        print(f"{os.path.basename(path)} ({len(raw)} bytes)")
+
+        for codec in codecs:
+            report(f"{codec.name}.loads",
+                   lambda: codec.loads(raw), args.number, len(raw))
+
+        payload = jsoncodec.select("json").loads(raw)
+        for codec in codecs:
+            report(f"{codec.name}.dumpb",
+                   lambda: codec.dumpb(payload), args.number, len(raw))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""App JWT signing throughput, per-call PEM signing vs AppIdentity.jwt.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.jwt_signing
+"""
+import time
+import timeit
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from ghapp.github.identity import AppIdentity
+
+
+def generate_key() -> str:
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend())
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+def report(name, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print(f"{name:<24} {number / elapsed:>12.1f} signatures/s")
+
+
+def main():
+    pem = generate_key()
+    identity = AppIdentity(app_id=1, private_key=pem)
+
+    def payload():
+        issue_time = int(time.time())
+        return dict(iat=issue_time, exp=issue_time + 600, iss=1)
+
+    report("pem per call (before)",
+           lambda: jwt.encode(payload(), pem, algorithm="RS256"), 100)
+    report("parsed key per call",
+           lambda: jwt.encode(
+               payload(), identity.signing_key(), algorithm="RS256"), 500)
+    report("AppIdentity.jwt (after)", identity.jwt, 100000)
+
+
+if __name__ == "__main__":
+    main()
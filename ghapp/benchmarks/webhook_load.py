@@ -0,0 +1,258 @@
+"""Webhook server throughput and latency under load.
+
+Replays the github and buildkite ping and buildkite job event fixtures in
+`ghapp/tests`, plus synthesized builds of many jobs, against a `Main.setup`
+server at a fixed request concurrency. Reports requests/s, p50/p95/p99
+request latency by event and peak memory growth of the process.
+
+By default the server runs in-process, processing job events against a local
+fake github api (`ghapp.tests.fakegithub`), and the report includes the
+server's `/metrics` after processing completes. With `--url` deliveries are
+sent to a running server instead, signed with `$GITHUB_WEBHOOK_SECRET` and
+`$BUILDKITE_WEBHOOK_SECRET`.
+
+Run from the `ghapp` directory:
+
+    python -m benchmarks.webhook_load [--builds N] [--jobs_per_build N] \\
+        [--concurrency N] [--repeat N] [--redeliver_fraction F] [--url URL]
+
+Every delivery has a unique delivery id, so none is deduplicated, unless
+`--redeliver_fraction` is set to resend that fraction of deliveries.
+"""
+import argparse
+import asyncio
+import copy
+import hmac
+import json
+import os
+import random
+import resource
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+from ghapp.app import Main
+from ghapp.buildkite.webhooks import BuildkiteHooks
+from ghapp.github.identity import AppIdentity
+from ghapp.github.urls import API_URL_ENV_VAR
+from ghapp.github.webhooks import GithubHooks
+from ghapp.tests.fakegithub import FakeGithub
+
+from .jwt_signing import generate_key
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "../ghapp/tests")
+
+# Job events of a synthesized job, with the job state sent in each
+JOB_LIFECYCLE = [
+    ("job.scheduled", "scheduled"),
+    ("job.activated", "scheduled"),
+    ("job.started", "running"),
+    ("job.finished", "passed"),
+]
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as inf:
+        return inf.read()
+
+
+def github_delivery(event: str, body: bytes, secret: bytes):
+    headers = {
+        "X-GitHub-Event": event,
+        "X-GitHub-Delivery": str(uuid.uuid4()),
+        "X-Hub-Signature-256":
+        "sha256=" + hmac.new(secret, msg=body, digestmod="sha256").hexdigest(),
+        "content-type": "application/json",
+    }
+    return ("github." + event, "/webhooks/github", headers, body)
+
+
+def buildkite_delivery(event: str, body: bytes, secret: str):
+    headers = {
+        "X-Buildkite-Event": event,
+        "X-Buildkite-Request": str(uuid.uuid4()),
+        "X-Buildkite-Token": secret,
+        "content-type": "application/json",
+    }
+    return ("buildkite." + event, "/webhooks/buildkite", headers, body)
+
+
+def synthesize_builds(template: dict, builds: int, jobs_per_build: int):
+    """Job event bodies for each job of synthesized builds, in order."""
+    for b in range(builds):
+        build = copy.deepcopy(template["build"])
+        build["id"] = str(uuid.uuid4())
+        build["number"] = b
+        build["commit"] = uuid.uuid4().hex + uuid.uuid4().hex[:8]
+
+        for event, state in JOB_LIFECYCLE:
+            for j in range(jobs_per_build):
+                job = dict(
+                    template["job"],
+                    id=f"{build['id'][:8]}-job-{j}",
+                    name=f"job {j}",
+                    state=state,
+                )
+                yield event, dict(template, event=event, job=job, build=build)
+
+
+def deliveries(args, github_secret: bytes, buildkite_secret: str):
+    """Deliveries of the fixtures and synthesized builds, each with a unique id.
+
+    `--redeliver_fraction` of deliveries are sent again, with the same id, at
+    the end of the load, measuring redelivery handling.
+    """
+    fixtures = [
+        ("github", "ping", load_fixture("github.ping.json")),
+        ("buildkite", "ping", load_fixture("buildkite.ping.json")),
+    ]
+    for name in ("buildkite.job.started.json", "buildkite.job.finished.json"):
+        body = load_fixture(name)
+        fixtures.append(("buildkite", json.loads(body)["event"], body))
+
+    def delivery(source, event, body):
+        if source == "github":
+            return github_delivery(event, body, github_secret)
+        return buildkite_delivery(event, body, buildkite_secret)
+
+    template = json.loads(load_fixture("buildkite.job.started.json"))
+    load = [delivery(*f) for _ in range(args.repeat) for f in fixtures]
+    load.extend(
+        delivery("buildkite", event, json.dumps(body).encode())
+        for event, body in synthesize_builds(
+            template, args.builds, args.jobs_per_build))
+
+    rand = random.Random(0)
+    load.extend(
+        (kind + ".redelivery", path, headers, body)
+        for kind, path, headers, body in list(load)
+        if rand.random() < args.redeliver_fraction)
+
+    return load
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def start_server(args):
+    """Start an in-process server and fake github api, returning (url, main, cleanup)."""
+    github = FakeGithub(
+        installations={"uw-ipd": 1}, latency=args.api_latency, seed=0)
+    github_runner = web.AppRunner(github.application())
+    await github_runner.setup()
+    github_site = web.TCPSite(github_runner, "127.0.0.1", 0)
+    await github_site.start()
+    github_port = github_site._server.sockets[0].getsockname()[1]
+    os.environ[API_URL_ENV_VAR] = f"http://127.0.0.1:{github_port}"
+
+    identity = AppIdentity(app_id=1, private_key=generate_key())
+    main = Main.setup(identity=identity, coalesce_window=args.coalesce_window)
+    runner = web.AppRunner(main.app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    async def cleanup():
+        await runner.cleanup()
+        await github_runner.cleanup()
+
+    return f"http://127.0.0.1:{port}", main, cleanup
+
+
+async def run(args):
+    if args.url:
+        url = args.url.rstrip("/")
+        main = None
+    else:
+        os.environ.setdefault(GithubHooks.SECRET_ENV_VAR, "github")
+        os.environ.setdefault(BuildkiteHooks.SECRET_ENV_VAR, "buildkite")
+        url, main, cleanup = await start_server(args)
+
+    load = deliveries(
+        args,
+        os.environ[GithubHooks.SECRET_ENV_VAR].encode(),
+        os.environ[BuildkiteHooks.SECRET_ENV_VAR],
+    )
+    pending = iter(load)
+
+    latencies = {}
+    errors = 0
+
+    async def worker(session):
+        nonlocal errors
+        for kind, path, headers, body in pending:
+            start = time.perf_counter()
+            async with session.post(url + path, headers=headers,
+                                    data=body) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors += 1
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+
+    rss_before = max_rss_mb()
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(worker(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        metrics = None
+        if main is not None:
+            await main.coalescer.stop(main.app)
+            await main.pipeline.join()
+            async with session.get(url + "/metrics") as resp:
+                metrics = await resp.json()
+
+    if main is not None:
+        await cleanup()
+
+    print(f"requests={len(load)} concurrency={args.concurrency} "
+          f"errors={errors} elapsed={elapsed:.2f}s "
+          f"throughput={len(load) / elapsed:.1f} req/s")
+
+    rows = sorted(latencies.items())
+    rows.append(("all", sum(latencies.values(), [])))
+    for kind, values in rows:
+        print(f"  {kind:<24} n={len(values):<6}"
+              f" p50 {percentile(values, 0.5) * 1000:>7.2f} ms"
+              f"  p95 {percentile(values, 0.95) * 1000:>7.2f} ms"
+              f"  p99 {percentile(values, 0.99) * 1000:>7.2f} ms")
+
+    print(f"max rss: {rss_before:.1f} MB -> {max_rss_mb():.1f} MB")
+    if metrics is not None:
+        print("metrics:", json.dumps(metrics, indent=2, sort_keys=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--builds", type=int, default=20,
+                        help="Number of synthesized builds.")
+    parser.add_argument("--jobs_per_build", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="Number of replays of each fixture.")
+    parser.add_argument("--redeliver_fraction", type=float, default=0.0,
+                        help="Fraction of deliveries resent with their id.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--coalesce_window", type=float, default=0.5)
+    parser.add_argument("--api_latency", type=float, default=0.02,
+                        help="Injected fake github api latency in seconds.")
+    parser.add_argument("--url",
+                        help="Target a running server, eg. http://host:8080")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == "__main__":
+    main()
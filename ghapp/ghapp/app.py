@@ -1,13 +1,28 @@
+from typing import Optional
+
 import logging
 import os
 
 import attr
 import cattr
+import aiohttp
 from aiohttp import web
 
 from .mind import Mind, Ping
 from .github.webhooks import GithubHooks
+from .github.identity import AppIdentity
+from .github.installations import InstallationIndex
+from .github.etagcache import ETagCache
+from .github.runindex import RunIndex
+from .github.retry import RetryPolicy
+from .github import api
+from .github import checks
 from .buildkite.webhooks import BuildkiteHooks
+from .buildkite import jobs
+from .handlers import RepoName, job_hook_to_check_action
+from .pipeline import JobEventPipeline, JobEventCoalescer
+
+logger = logging.getLogger(__name__)
 
 
 @attr.s(auto_attribs=True, slots=True)
@@ -16,6 +31,20 @@ class Main:
     github_hooks: GithubHooks
     buildkite_hooks: BuildkiteHooks
     mind: Mind
+    identity: Optional[AppIdentity] = None
+    installations: InstallationIndex = attr.Factory(InstallationIndex)
+    runs_cache: ETagCache = attr.Factory(ETagCache)
+    run_index: RunIndex = attr.Factory(RunIndex)
+    retry: RetryPolicy = attr.Factory(RetryPolicy)
+    session: Optional[aiohttp.ClientSession] = None
+    pipeline: Optional[JobEventPipeline] = None
+    coalescer: Optional[JobEventCoalescer] = None
+
+    async def open_session(self, app: web.Application):
+        self.session = api.client_session()
+
+    async def close_session(self, app: web.Application):
+        await self.session.close()
 
     async def get_mind(self, req: web.Request):
         return web.Response(body=self.mind.thought)
@@ -25,8 +54,79 @@ class Main:
         ping = cattr.structure(body, Ping)
         self.mind.listen(ping)
 
+    async def get_metrics(self, req: web.Request):
+        metrics = dict(
+            runs_cache=self.runs_cache.stats(),
+            run_index=self.run_index.stats(),
+            deliveries=dict(
+                github=self.github_hooks.deliveries.stats(),
+                buildkite=self.buildkite_hooks.deliveries.stats(),
+            ),
+        )
+        if self.pipeline is not None:
+            metrics["job_events"] = dict(
+                self.pipeline.metrics(), coalesced=self.coalescer.metrics())
+        if self.identity is not None:
+            metrics["rate_limits"] = {
+                str(k): v
+                for k, v in self.identity.rate_limits.budget().items()
+            }
+        return web.json_response(metrics)
+
+    async def push_job(self, name, body):
+        hook = cattr.structure(body, jobs.JobHook)
+        logger.info("job event: %s %s", name, hook.job.id)
+
+        # Rejected deliveries aren't recorded, so their redelivery is processed
+        if not self.pipeline.accepts(hook):
+            raise web.HTTPServiceUnavailable(text="job event queue full")
+        self.coalescer.push(hook)
+
+    async def apply_job(self, hook: jobs.JobHook):
+        """Create or update the check run for a job event.
+
+        Runs are resolved via the run index, falling back to a full listing
+        of the commit's runs if the job's run is not indexed. Listings are
+        conditional, so re-listing an unchanged commit is cheap.
+        """
+        repo = RepoName.parse(hook.pipeline.repository)
+        sha = hook.build.commit
+        sesh = api.InstallationSession(self.session, self.identity, repo.owner)
+
+        run_id, known = self.run_index.resolve(
+            repo.owner, repo.repo, sha, hook.job.id)
+        if not known:
+            current_runs = await self.retry.call(lambda: checks.GetRuns(
+                owner=repo.owner,
+                repo=repo.repo,
+                ref=sha,
+                cache=self.runs_cache,
+            ).execute(sesh))
+            self.run_index.add_listing(repo.owner, repo.repo, sha, current_runs)
+
+            run_id, _ = self.run_index.lookup(
+                repo.owner, repo.repo, sha, hook.job.id)
+
+        current_runs = []
+        if run_id is not None:
+            current_runs.append(
+                checks.RunDetails(
+                    name=hook.job.name, id=run_id, external_id=hook.job.id))
+
+        action = job_hook_to_check_action(hook, current_runs)
+        logger.info("action: %s", action)
+
+        result = await action.submit(sesh, self.retry)
+        self.run_index.add(repo.owner, repo.repo, sha, result)
+
     @staticmethod
-    def setup(loop=None):
+    def setup(loop=None,
+              identity: Optional[AppIdentity] = None,
+              coalesce_window: float = 0.5):
+        """Setup server, processing buildkite job events if given an identity.
+
+        Job events are coalesced over `coalesce_window` seconds per job.
+        """
         sdir = os.path.join(os.path.dirname(__file__), "../secrets/")
 
         app = web.Application(loop=loop)
@@ -37,15 +137,42 @@ class Main:
             app=app,
             github_hooks=github_hooks,
             buildkite_hooks=buildkite_hooks,
-            mind=mind)
+            mind=mind,
+            identity=identity,
+        )
+        if identity is not None:
+            main.installations = identity.installations
+            main.run_index.app_id = identity.app_id
+            main.pipeline = JobEventPipeline(process=main.apply_job)
+            main.coalescer = JobEventCoalescer(
+                forward=main.pipeline.submit, window=coalesce_window)
+
+        app.on_startup.append(main.open_session)
+        app.on_cleanup.append(main.close_session)
+
+        if main.pipeline is not None:
+            app.on_startup.append(main.pipeline.start)
+            app.on_shutdown.append(main.coalescer.stop)
+            app.on_shutdown.append(main.pipeline.stop)
 
         app.router.add_get("/zen", main.get_mind)
+        app.router.add_get("/metrics", main.get_metrics)
 
         app.router.add_post('/webhooks/github', github_hooks.handler)
         github_hooks.signals.add_handler("ping", main.push_ping)
+        github_hooks.signals.add_handler(
+            "installation", main.installations.hook)
+        github_hooks.signals.add_handler(
+            "installation_repositories", main.installations.hook)
+        github_hooks.signals.add_handler("check_run", main.run_index.hook)
         github_hooks.signals.freeze()
 
         app.router.add_post('/webhooks/buildkite', buildkite_hooks.handler)
+        if main.pipeline is not None:
+            for event in jobs.JobEvent:
+                buildkite_hooks.signals.add_handler(event.value, main.push_job)
+        else:
+            logger.warning("No app identity, ignoring buildkite job events.")
         buildkite_hooks.signals.freeze()
 
 
@@ -57,7 +184,11 @@ def create_app(loop):
         logging.root.setLevel(logging.DEBUG)
         logging.info("debug")
 
-    app = Main.setup(loop=loop).app
+    identity = None
+    if os.getenv(AppIdentity.APP_ID_ENV_VAR):
+        identity = AppIdentity()
+
+    app = Main.setup(loop=loop, identity=identity).app
     app.on_startup.append(set_verbose_logging)
 
     return app
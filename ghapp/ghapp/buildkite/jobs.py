@@ -6,6 +6,7 @@ from ..cattrs import ignore_unknown_attribs
 
 
 class JobEvent(enum.Enum):
+    scheduled = "job.scheduled"
     activated = "job.activated"
     started = "job.started"
     finished = "job.finished"
@@ -101,3 +102,4 @@ class JobEnviron:
     BUILDKITE_COMMAND: str
     BUILDKITE_TIMEOUT: bool
     BUILDKITE_COMMAND_EXIT_STATUS: Optional[int] = None
+    BUILDKITE_BUILD_CHECKOUT_PATH: Optional[str] = None
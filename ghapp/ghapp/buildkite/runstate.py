@@ -0,0 +1,53 @@
+from typing import Optional
+
+import logging
+import os
+import time
+
+import attr
+
+from ..lockedfile import locked_json
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class RunState:
+    """Check run ids created by a job's hooks, keyed by buildkite job id.
+
+    Allows the post-command hook to update the run created by pre-command
+    directly, rather than rediscovering it via a check run listing. Entries
+    older than `max_age` are purged on write.
+    """
+    path: str
+    max_age: float = 24 * 60 * 60
+
+    FILE_NAME = ".ghapp-check-runs.json"
+
+    @classmethod
+    def for_checkout(cls, checkout_path: str) -> "RunState":
+        """State file alongside the build checkout directory."""
+        parent = os.path.dirname(os.path.abspath(checkout_path))
+        return cls(path=os.path.join(parent, cls.FILE_NAME))
+
+    def get(self, job_id: str) -> Optional[str]:
+        try:
+            with locked_json(self.path, exclusive=False) as runs:
+                entry = runs.get(job_id)
+        except OSError:
+            logger.warning("Unable to read run state: %s", self.path)
+            return None
+
+        return entry["id"] if entry else None
+
+    def put(self, job_id: str, run_id: str):
+        now = time.time()
+
+        try:
+            with locked_json(self.path) as runs:
+                for k in [k for k, v in runs.items()
+                          if v["at"] < now - self.max_age]:
+                    del runs[k]
+                runs[job_id] = dict(id=run_id, at=now)
+        except OSError:
+            logger.warning("Unable to write run state: %s", self.path)
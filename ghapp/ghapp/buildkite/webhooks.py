@@ -1,13 +1,19 @@
 from typing import Optional
 import os
 
+import hmac
 import logging
+import time
 
 import attr
 
 from aiohttp import web
 
 from ..signalset import SignalSet
+from .. import jsoncodec
+from ..webhooks import (
+    MAX_BODY_SIZE, BodyTooLarge, DeliverySet, process_once, read_body,
+    too_large)
 
 logger = logging.getLogger(__name__)
 
@@ -42,17 +48,67 @@ class BuildkiteHooks:
 
     signals: SignalSet = attr.Factory(SignalSet)
 
+    max_body_size: int = MAX_BODY_SIZE
+    deliveries: DeliverySet = attr.Factory(DeliverySet)
+
+    # Maximum age, in seconds, of a signed delivery's timestamp
+    max_signature_age: float = 300
+
+    @staticmethod
+    def parse_signature(header: str) -> dict:
+        """Parse an `x-buildkite-signature` of `timestamp=...,signature=...`."""
+        return dict(f.strip().partition("=")[::2] for f in header.split(","))
+
+    def verify_signature(self, fields: dict, mac: "hmac.HMAC") -> bool:
+        """Verify a parsed signature, `mac` the HMAC-SHA256 of "{timestamp}.{body}"."""
+        try:
+            age = abs(time.time() - int(fields.get("timestamp", "")))
+        except ValueError:
+            return False
+        if age > self.max_signature_age:
+            return False
+
+        return hmac.compare_digest(
+            fields.get("signature", "").encode(), mac.hexdigest().encode())
+
     async def handler(self, req: web.Request):
-        # Get and validate signature
+        # Acknowledge redeliveries without processing
+        return await process_once(
+            self.deliveries, req.headers.get("x-buildkite-request"),
+            lambda: self.process(req))
+
+    async def process(self, req: web.Request):
+        # Get token or signature, rejecting unauthenticated deliveries
         token = req.headers.get('x-buildkite-token')
-        if token:
-            if not token == self.secret:
-                logging.debug("x-buildkite-token: %s", token)
-                logging.debug("secret: %s", self.secret)
+        signature = req.headers.get('x-buildkite-signature')
+
+        if signature:
+            fields = self.parse_signature(signature)
+            mac = hmac.new(
+                self.secret.encode(),
+                f"{fields.get('timestamp', '')}.".encode(), "sha256")
+        elif token:
+            if not hmac.compare_digest(token.encode(), self.secret.encode()):
                 return web.Response(status=401, text="invalid x-buildkite-token")
+            mac = None
+        else:
+            return web.Response(
+                status=401, text="missing x-buildkite-token or signature")
+
+        # Read body, computing the signature in the same pass
+        try:
+            raw_body = await read_body(req, mac, self.max_body_size)
+        except BodyTooLarge:
+            return too_large(self.max_body_size)
+
+        if mac is not None and not self.verify_signature(fields, mac):
+            return web.Response(status=401, text="invalid x-buildkite-signature")
 
         # Get body, only application/json
-        body = await req.json()
+        try:
+            body = jsoncodec.loads(raw_body)
+        except ValueError:
+            return web.Response(status=400, text="invalid payload")
 
         name = req.headers['x-buildkite-event']
         logger.debug("name: %s", name)
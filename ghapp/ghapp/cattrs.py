@@ -12,6 +12,38 @@ def maybe_parse_bool(obj, cls):
 
 cattr.register_structure_hook(bool, maybe_parse_bool)
 
+def _compile(name, lines, namespace):
+    """Compile a generated function `name` from source `lines`."""
+    source = "\n".join(lines)
+    code = compile(source, "<ghapp.cattrs %s>" % name, "exec")
+    exec(code, namespace)
+    return namespace[name]
+
+def _make_structure_ignoring_unknown(cls, converter):
+    """Generate a dict structure function for cls, ignoring unknown keys.
+
+    Equivalent to `Converter.structure_attrs_fromdict` on a copy of the input
+    filtered to the class's attributes, without the copy. Private attributes
+    are passed as their `__init__` argument, without leading underscores.
+    """
+    namespace = dict(dispatch=converter._structure_func.dispatch)
+    lines = ["def structure_%s(obj, cl):" % cls.__name__, "    kw = {}"]
+
+    for i, a in enumerate(attr.fields(cls)):
+        arg = a.name.lstrip("_")
+        lines.append("    if %r in obj:" % a.name)
+        if a.type is None:
+            lines.append("        kw[%r] = obj[%r]" % (arg, a.name))
+        else:
+            namespace["t%i" % i] = a.type
+            lines.append(
+                "        kw[%r] = dispatch(t%i)(obj[%r], t%i)" %
+                (arg, i, a.name, i))
+
+    lines.append("    return cl(**kw)")
+
+    return _compile("structure_%s" % cls.__name__, lines, namespace)
+
 def _register_ignore_unknown_attribs(cls, converter=None):
     if converter is None:
         converter = cattr.global_converter
@@ -20,6 +52,13 @@ def _register_ignore_unknown_attribs(cls, converter=None):
         raise TypeError("class does not have attrs: %s" % cls)
 
     prev_structure = converter._structure_func.dispatch(cls)
+
+    if prev_structure == converter.structure_attrs_fromdict:
+        converter.register_structure_hook(
+            cls, _make_structure_ignoring_unknown(cls, converter))
+        return
+
+    # Wrap non-default hooks, filtering a copy of the input
     attr_names = {f.name for f in attr.fields(cls)}
 
     def structure_ignoring_unknown(obj, cls):
@@ -41,6 +80,54 @@ def ignore_unknown_attribs(maybe_cls = None, converter=None):
     else:
         return bound
 
+def _is_optional(type_):
+    return isinstance(type_, typing._Union) and type(None) in type_.__args__
+
+def _drop_optional_none(cls, unstructured):
+    """Delete optional attributes of cls with None values from unstructured."""
+    for a in attr.fields(cls):
+        if (_is_optional(a.type) and a.name in unstructured
+                and unstructured[a.name] is None):
+            del unstructured[a.name]
+    return unstructured
+
+def _make_unstructure_ignoring_optional_none(cls, converter):
+    """Generate a dict unstructure function for cls, omitting None optionals.
+
+    Equivalent to `Converter.unstructure_attrs_asdict`, skipping optional
+    attributes with None values rather than deleting them afterwards.
+    Instances of subclasses, which may have additional attributes, are
+    unstructured by `unstructure_attrs_asdict`.
+    """
+    def unstructure_subclass(obj):
+        return _drop_optional_none(
+            obj.__class__, converter.unstructure_attrs_asdict(obj))
+
+    namespace = dict(
+        cls=cls,
+        unstructure_subclass=unstructure_subclass,
+        dispatch=converter._unstructure_func.dispatch,
+        dict_factory=converter._dict_factory,
+    )
+    lines = [
+        "def unstructure_%s(obj):" % cls.__name__,
+        "    if obj.__class__ is not cls:",
+        "        return unstructure_subclass(obj)",
+        "    rv = dict_factory()",
+    ]
+
+    for a in attr.fields(cls):
+        lines.append("    v = obj.%s" % a.name)
+        if _is_optional(a.type):
+            lines.append("    if v is not None:")
+            lines.append("        rv[%r] = dispatch(v.__class__)(v)" % a.name)
+        else:
+            lines.append("    rv[%r] = dispatch(v.__class__)(v)" % a.name)
+
+    lines.append("    return rv")
+
+    return _compile("unstructure_%s" % cls.__name__, lines, namespace)
+
 def _register_ignore_optional_none(cls, converter=None):
     if converter is None:
         converter = cattr.global_converter
@@ -49,18 +136,15 @@ def _register_ignore_optional_none(cls, converter=None):
         raise TypeError("class does not have attrs: %s" % cls)
 
     prev_unstructure = converter._unstructure_func.dispatch(cls)
-    optional_attrs = {
-        f.name for f in attr.fields(cls)
-        if isinstance(f.type, typing._Union) and type(None) in f.type.__args__
-    }
 
-    def unstructure_ignoring_optional_none(obj):
-        unstructured = prev_unstructure(obj)
+    if prev_unstructure == converter.unstructure_attrs_asdict:
+        converter.register_unstructure_hook(
+            cls, _make_unstructure_ignoring_optional_none(cls, converter))
+        return
 
-        for a in optional_attrs:
-            if a in unstructured and unstructured[a] is None:
-                del unstructured[a]
-        return unstructured
+    # Wrap non-default hooks, deleting None optionals from their output
+    def unstructure_ignoring_optional_none(obj):
+        return _drop_optional_none(cls, prev_unstructure(obj))
 
     converter.register_unstructure_hook(cls, unstructure_ignoring_optional_none)
 
@@ -1,22 +1,21 @@
+import functools
 import logging
 import json
 import os
-from typing import Optional
+from typing import List, Optional
 
-import cattr
-
-import aiohttp
-import aiorun
-import asyncio
 import click
-from decorator import decorator
 
 from .github.identity import AppIdentity
-from .github import checks
-from .github.gitcredentials import credential_helper
+from .github.identity import TokenCache
+from .github.gitcredentials import credential_erase, FileTokenCache
+
+from . import client
 
-from .buildkite import jobs
-from .handlers import RepoName, job_environ_to_check_action
+# Dependencies of github api commands (aiohttp, aiorun, cattrs, giturlparse,
+# jwt & cryptography) are imported within commands, minimizing the startup
+# time of no-op commands called via hooks or as git-credential helpers. See
+# `benchmarks/cli_startup.py`.
 
 logger = logging.getLogger(__name__)
 
@@ -24,17 +23,28 @@ logger = logging.getLogger(__name__)
 pass_appidentity = click.make_pass_decorator(AppIdentity, ensure=True)
 
 
-@decorator
-def aiomain(coro, *args, **kwargs):
-    aiorun.logger.setLevel(51)
+def aiomain(coro):
+    @functools.wraps(coro)
+    def run(*args, **kwargs):
+        import asyncio
+        import aiorun
+        aiorun.logger.setLevel(51)
 
-    async def main():
-        try:
-            await coro(*args, **kwargs)
-        finally:
-            asyncio.get_event_loop().stop()
+        async def main():
+            cancelled = False
+            try:
+                await coro(*args, **kwargs)
+            except asyncio.CancelledError:
+                # Interrupted by signal, aiorun completes shutdown.
+                cancelled = True
+                raise
+            finally:
+                if not cancelled:
+                    asyncio.get_event_loop().stop()
 
-    return aiorun.run(main())
+        return aiorun.run(main())
+
+    return run
 
 
 @click.group()
@@ -58,15 +68,38 @@ def aiomain(coro, *args, **kwargs):
     "Resolved via $GITHUB_APP_AUTH_DEBUG ('1' or '2').",
     envvar="GITHUB_APP_AUTH_DEBUG",
 )
+@click.option(
+    '--token_cache',
+    is_flag=True,
+    help=("Share installation tokens between processes via a file cache. "
+          "Resolved from $%s." % FileTokenCache.ENABLE_ENV_VAR),
+    envvar=FileTokenCache.ENABLE_ENV_VAR,
+)
 @click.pass_context
-def main(ctx, app_id, private_key, verbose):
+def main(ctx, app_id, private_key, verbose, token_cache):
     if verbose:
         logging.basicConfig(
             level=logging.INFO if verbose == 1 else logging.DEBUG,
             format="%(name)s %(message)s",
         )
 
-    ctx.obj = AppIdentity(app_id=app_id, private_key=private_key)
+    ctx.obj = resolve_identity(app_id, private_key, token_cache)
+
+
+def resolve_identity(app_id=None, private_key=None, token_cache=None):
+    """Resolve app identity, with file token cache if enabled."""
+    if token_cache is None:
+        token_cache = os.getenv(FileTokenCache.ENABLE_ENV_VAR, "") in (
+            "1", "true", "on")
+
+    app_id = AppIdentity._resolve_app_id(app_id)
+
+    return AppIdentity(
+        app_id=app_id,
+        private_key=private_key,
+        token_cache=(
+            FileTokenCache.for_app(app_id) if token_cache else TokenCache()),
+    )
 
 
 @main.add_command
@@ -74,9 +107,12 @@ def main(ctx, app_id, private_key, verbose):
 @pass_appidentity
 @aiomain
 async def current(appidentity: AppIdentity):
-    async with aiohttp.ClientSession(
-            headers=appidentity.app_headers(), ) as session:
-        async with session.get('https://api.github.com/app', ) as resp:
+    from .github import api
+    from .github.urls import api_url
+
+    async with api.client_session() as session:
+        sesh = api.AppSession(session, appidentity)
+        async with sesh.get(api_url('/app')) as resp:
             resp.raise_for_status()
             print(json.dumps(await resp.json(), indent=2))
 
@@ -91,8 +127,11 @@ async def token(appidentity, account):
 
 
 @main.group(help="git-credential helper implementation.")
-def credential():
-    pass
+@click.pass_context
+def credential(ctx):
+    # Resolve identity if invoked directly as git-credential-github-app-auth
+    if ctx.obj is None:
+        ctx.obj = resolve_identity()
 
 
 @credential.add_command
@@ -102,11 +141,10 @@ def credential():
 @click.argument('output', type=click.File('w'), default="-")
 @aiomain
 async def get(appidentity, input, output):
-    # https://git-scm.com/docs/git-credential
+    from . import operations
+
     logger.debug("get id: %s input: %s output: %s", appidentity, input, output)
-    output.write(await credential_helper(input.read(),
-                                         appidentity.installation_token_for))
-    output.write("\n")
+    output.write(await operations.credential_get(appidentity, input.read()))
 
 
 @credential.command(help="no-op git-credential interface")
@@ -114,9 +152,12 @@ def store():
     pass
 
 
-@credential.command(help="no-op git-credential interface")
-def erase():
-    pass
+@credential.add_command
+@click.command(help="Evict rejected credentials from the token cache.")
+@pass_appidentity
+@click.argument('input', type=click.File('r'), default="-")
+def erase(appidentity, input):
+    credential_erase(input.read(), appidentity.token_cache.evict)
 
 
 @main.group(help="github checks api support")
@@ -129,15 +170,15 @@ def check():
 @pass_appidentity
 @click.argument('repo', type=str)
 @click.argument('ref', type=str)
+@click.option('--name', type=str, default=None, help="Filter by check name.")
 @aiomain
-async def list(app: AppIdentity, repo: str, ref: str):
+async def list(app: AppIdentity, repo: str, ref: str, name: Optional[str]):
     """List current checks on given repo ref."""
-    repo = RepoName.parse(repo)
+    from .github import api
+    from . import operations
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
-        fetch = checks.GetRuns(owner=repo.owner, repo=repo.repo, ref=ref)
-        print(await fetch.execute(sesh))
+    async with api.client_session() as session:
+        print(await operations.check_list(app, session, repo, ref, name))
 
 
 @check.add_command
@@ -149,7 +190,7 @@ async def list(app: AppIdentity, repo: str, ref: str):
 @click.option('--sha', type=str, default=None)
 @click.option('--output_title', type=str, default=None)
 @click.option('--output_summary', type=str, default=None)
-@click.option('--output', type=str, default=None)
+@click.option('--output', '--output_details', type=str, default=None)
 @aiomain
 async def push(
         app: AppIdentity,
@@ -162,44 +203,20 @@ async def push(
         output: Optional[str],
 ):
     """Push a check to github."""
-    repo = RepoName.parse(repo)
-    output = load_job_output(output_title, output_summary, output)
-
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
-
-        if not sha:
-            logging.info("Resolving branch sha: %s", branch)
-            ref_url = (
-                f"https://api.github.com"
-                f"/repos/{repo.owner}/{repo.repo}/git/refs/heads/{branch}"
-            )
-            logging.debug(ref_url)
-            resp = await sesh.get(ref_url)
-            logging.info(resp)
-            sha = (await resp.json())["object"]["sha"]
-
-        action = checks.CreateRun(
-            owner=repo.owner,
-            repo=repo.repo,
-            run=checks.RunDetails(
-                head_branch=branch,
-                head_sha=sha,
-                name=name,
-                status=checks.Status.in_progress,
-                output = output,
-            ))
-
-        async with action.execute(sesh) as resp:
-            logging.debug(resp)
+    from .github import api
+    from .github.retry import RetryPolicy
+    from .output import OutputLimits
+    from . import operations
 
-            try:
-                resp.raise_for_status()
-            except Exception:
-                logging.exception((await resp.json())["message"])
-                raise
+    output = operations.load_job_output(
+        output_title, output_summary, output,
+        limits=OutputLimits.from_environ(os.environ))
+    retry = RetryPolicy.from_environ(os.environ)
 
-            print(await resp.json())
+    async with api.client_session() as session:
+        print(await operations.check_push(
+            app, session, repo, branch, name, sha=sha, output=output,
+            retry=retry))
 
 
 @check.add_command
@@ -216,30 +233,43 @@ async def update(
         name: str,
 ):
     """List current checks on given repo ref."""
-    repo = RepoName.parse(repo)
+    from .github import api
+    from .github.retry import RetryPolicy
+    from . import operations
 
-    action = checks.UpdateRun(
-        owner=repo.owner,
-        repo=repo.repo,
-        run=checks.RunDetails(
-            id=id,
-            name=name,
-            status=checks.Status.in_progress,
-        ))
+    retry = RetryPolicy.from_environ(os.environ)
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
+    async with api.client_session() as session:
+        print(await operations.check_update(
+            app, session, repo, id, name, retry=retry))
 
-        async with action.execute(sesh) as resp:
-            logging.debug(resp)
 
-            try:
-                resp.raise_for_status()
-            except Exception:
-                logging.exception((await resp.json())["message"])
-                raise
+@check.add_command
+@click.command()
+@pass_appidentity
+@click.argument('input', type=click.File('r'), default="-")
+@click.option(
+    '--concurrency',
+    type=int,
+    default=16,
+    help="Maximum number of check runs updated concurrently.")
+@aiomain
+async def apply(app: AppIdentity, input, concurrency: int):
+    """Create or update check runs from json lines.
+
+    Reads check run records, with an additional "repo" field, from INPUT and
+    writes a json line result for each record.
+    """
+    from .github import api
+    from .github.retry import RetryPolicy
+    from . import operations
+
+    retry = RetryPolicy.from_environ(os.environ)
 
-            print(await resp.json())
+    async with api.client_session() as session:
+        async for result in operations.check_apply(
+                app, session, input, concurrency=concurrency, retry=retry):
+            print(json.dumps(result), flush=True)
 
 
 @check.add_command
@@ -247,57 +277,99 @@ async def update(
 @pass_appidentity
 @click.option('--output_title', type=str, default=None)
 @click.option('--output_summary', type=str, default=None)
-@click.option('--output', type=str, default=None)
+@click.option('--output', '--output_details', type=str, default=None)
+@click.option(
+    '--annotate',
+    type=str,
+    default=None,
+    help="Tool output file, parsed for check run annotations.")
+@click.option(
+    '--problem_matcher',
+    type=str,
+    multiple=True,
+    default=["gcc", "flake8"],
+    help="Builtin matcher name (gcc, flake8) or regex for --annotate.")
 @aiomain
 async def from_job_env(
     app: AppIdentity,
     output_title: str,
     output_summary: Optional[str],
     output: Optional[str],
+    annotate: Optional[str],
+    problem_matcher: List[str],
 ):
-    job_env = cattr.structure(dict(os.environ), jobs.JobEnviron)
-    logging.info("job_env: %s", job_env)
-
-    repo = RepoName.parse(job_env.BUILDKITE_REPO)
-
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
-
-        current_runs = await checks.GetRuns(
-            owner=repo.owner,
-            repo=repo.repo,
-            ref=job_env.BUILDKITE_COMMIT,
-        ).execute(sesh)
-        logging.info("current_runs: %s", current_runs)
-
-        check_action = job_environ_to_check_action(job_env, current_runs)
-        output = load_job_output(output_title, output_summary, output)
-        if output:
-            check_action.run.output = output
-
-        logging.info("action: %s", check_action)
-
-
-        await check_action.execute(sesh)
-
-def load_job_output(output_title, output_summary, output):
-    """Loads job output (maybe) from files, to be moved to handler layer."""
-    def read_if_file(val):
-        if os.path.exists(val):
-            logger.info("Reading file: %s", val)
-            with open(val, "r") as inf:
-                return inf.read()
-        else:
-            return val
-
-    if output_title:
-        assert output_summary
-        return checks.Output(
-            title = output_title,
-            summary = read_if_file(output_summary),
-            text = read_if_file(output) if output else None
-        )
-    else:
-        return None
+    from .github import api
+    from .github.retry import RetryPolicy
+    from .output import OutputLimits
+    from . import operations
 
+    output = operations.load_job_output(
+        output_title, output_summary, output,
+        limits=OutputLimits.from_environ(os.environ))
+    retry = RetryPolicy.from_environ(os.environ)
+    root = os.environ.get("BUILDKITE_BUILD_CHECKOUT_PATH", "")
 
+    with operations.load_job_annotations(
+            annotate, problem_matcher, root) as annotations:
+        async with api.client_session() as session:
+            await operations.check_from_job_env(
+                app, session, os.environ, output, retry=retry,
+                annotations=annotations)
+
+
+@main.add_command
+@click.command(help="Serve credential and check commands over a unix socket.")
+@pass_appidentity
+@click.option(
+    '--socket',
+    type=str,
+    default=None,
+    help=("Socket path, resolved from $%s or the user runtime dir." %
+          client.SOCKET_ENV_VAR),
+)
+@aiomain
+async def daemon(app: AppIdentity, socket: Optional[str]):
+    from .daemon import serve
+
+    await serve(app, socket or client.socket_path())
+
+
+@main.add_command
+@click.command(help="Serve github and buildkite webhooks.")
+@click.option('--host', type=str, default="0.0.0.0")
+@click.option('--port', type=int, default=8080)
+@click.option(
+    '--workers',
+    type=int,
+    default=None,
+    help="Number of worker processes, defaults to the cpu count.")
+@click.option(
+    '--max_connections',
+    type=int,
+    default=1024,
+    help="Per-worker open connection limit, beyond which connections are "
+    "rejected with 503.")
+@click.option(
+    '--graceful_timeout',
+    type=float,
+    default=30,
+    help="Seconds to complete in-flight requests on shutdown or reload.")
+@click.pass_context
+def serve(ctx, host, port, workers, max_connections, graceful_timeout):
+    from .serve import serve as serve_webhooks
+
+    # Resolved in each worker, so reloaded workers pick up key changes
+    params = ctx.find_root().params
+
+    def identity():
+        return resolve_identity(
+            params["app_id"], params["private_key"], params["token_cache"])
+
+    ctx.exit(serve_webhooks(
+        identity,
+        host=host,
+        port=port,
+        workers=workers,
+        max_connections=max_connections,
+        graceful_timeout=graceful_timeout,
+    ))
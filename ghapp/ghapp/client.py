@@ -0,0 +1,102 @@
+"""Minimal `ghapp daemon` client, falling back to the full ghapp cli.
+
+Forwards daemon-supported commands over the daemon's unix socket, importing
+only the standard library. Any other command, or any command when the daemon
+is not running or fails to process the request, is passed through to `ghapp`.
+
+Usage is identical to `ghapp`, eg. as a git credential helper:
+
+    git config credential.helper '!ghapp-client credential'
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+SOCKET_ENV_VAR = "GHAPP_DAEMON_SOCKET"
+
+DAEMON_COMMANDS = {
+    ("credential", "get"),
+    ("credential", "erase"),
+    ("check", "list"),
+    ("check", "push"),
+    ("check", "update"),
+    ("check", "from-job-env"),
+}
+
+VERBOSE_FLAGS = {"-v", "-vv", "--verbose"}
+
+
+def socket_path() -> str:
+    """Daemon socket path, from env or in the user's runtime directory."""
+    path = os.getenv(SOCKET_ENV_VAR)
+    if path:
+        return path
+
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, "ghapp-%s.sock" % os.getuid())
+
+
+def daemon_request(request: dict, path: str) -> dict:
+    """Send a single json request to the daemon, returning its json response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+
+        response = b"".join(iter(lambda: sock.recv(65536), b""))
+
+    # Raises ValueError on an empty or malformed response
+    response = json.loads(response.decode())
+    if not (isinstance(response, dict)
+            and {"exit", "stdout", "stderr"} <= set(response)):
+        raise ValueError(f"Invalid daemon response: {response!r}")
+
+    return response
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # The daemon has its own identity and logging config, so only the
+    # verbosity flags passed by the plugin hooks are accepted.
+    args = [a for a in argv if a not in VERBOSE_FLAGS]
+
+    if tuple(args[:2]) in DAEMON_COMMANDS and not (
+            args[:2] == ["credential", "get"] and len(args) > 2):
+        request = dict(
+            argv=args,
+            stdin=sys.stdin.read() if args[0] == "credential" else "",
+            env=dict(os.environ),
+            cwd=os.getcwd(),
+        )
+
+        try:
+            response = daemon_request(request, socket_path())
+        except (OSError, ValueError):
+            response = None
+
+        if response is not None and "error" in response:
+            # Unprocessed by the daemon, eg. an oversized request
+            sys.stderr.write(response["stderr"])
+            response = None
+
+        if response is not None:
+            sys.stdout.write(response["stdout"])
+            sys.stderr.write(response["stderr"])
+            sys.exit(response["exit"])
+
+        if request["stdin"]:
+            # Replay consumed credential input for the full cli.
+            stdin_r, stdin_w = os.pipe()
+            os.write(stdin_w, request["stdin"].encode())
+            os.close(stdin_w)
+            os.dup2(stdin_r, sys.stdin.fileno())
+
+    os.execvp("ghapp", ["ghapp"] + argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Long-lived credential and check command server for `ghapp daemon`.
+
+Holds an app identity, with its token cache, and a pooled client session for
+the lifetime of the process, serving `ghapp.client` requests over a unix
+socket. Requests are a single json line of the form:
+
+    {"argv": [...], "stdin": "...", "env": {...}, "cwd": "..."}
+
+and receive a single json line response:
+
+    {"exit": 0, "stdout": "...", "stderr": "..."}
+
+Requests the daemon is unable to read are answered with an additional
+`"error"` field, and are not processed.
+"""
+from typing import Awaitable, Callable, Dict, Tuple
+
+import asyncio
+import json
+import logging
+import os
+import socket
+
+import attr
+import aiohttp
+import click
+
+from .github.identity import AppIdentity
+from .github import api
+from .github import gitcredentials
+from .github.retry import RetryPolicy
+from .github.etagcache import ETagCache
+from .output import OutputLimits
+from . import cli
+from . import operations
+
+logger = logging.getLogger(__name__)
+
+# Requests carry the client's environment and stdin, which may exceed the
+# default 64 KiB stream limit in buildkite jobs.
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+# The daemon receives no installation webhooks, so periodically re-lists
+INSTALLATIONS_REFRESH_INTERVAL = 300
+
+
+@attr.s(auto_attribs=True)
+class Daemon:
+    app: AppIdentity
+    session: aiohttp.ClientSession
+    runs_cache: ETagCache = attr.Factory(ETagCache)
+
+    async def credential_get(self, request, **params) -> str:
+        return await operations.credential_get(
+            self.app, request["stdin"], self.session)
+
+    async def credential_erase(self, request, **params) -> str:
+        gitcredentials.credential_erase(
+            request["stdin"], self.app.token_cache.evict)
+        return ""
+
+    async def check_list(self, request, repo, ref, name) -> str:
+        result = await operations.check_list(
+            self.app, self.session, repo, ref, name, cache=self.runs_cache)
+        return f"{result}\n"
+
+    async def check_push(self, request, repo, branch, name, sha, output_title,
+                         output_summary, output) -> str:
+        output = operations.load_job_output(
+            output_title, output_summary, output, cwd=request["cwd"],
+            limits=OutputLimits.from_environ(request["env"]))
+        result = await operations.check_push(
+            self.app, self.session, repo, branch, name, sha=sha, output=output,
+            retry=RetryPolicy.from_environ(request["env"]))
+        return f"{result}\n"
+
+    async def check_update(self, request, repo, id, name) -> str:
+        result = await operations.check_update(
+            self.app, self.session, repo, id, name,
+            retry=RetryPolicy.from_environ(request["env"]))
+        return f"{result}\n"
+
+    async def check_from_job_env(self, request, output_title, output_summary,
+                                 output, annotate, problem_matcher) -> str:
+        output = operations.load_job_output(
+            output_title, output_summary, output, cwd=request["cwd"],
+            limits=OutputLimits.from_environ(request["env"]))
+        root = request["env"].get("BUILDKITE_BUILD_CHECKOUT_PATH", "")
+
+        with operations.load_job_annotations(
+                annotate, problem_matcher, root,
+                cwd=request["cwd"]) as annotations:
+            await operations.check_from_job_env(
+                self.app, self.session, request["env"], output,
+                retry=RetryPolicy.from_environ(request["env"]),
+                cache=self.runs_cache,
+                annotations=annotations)
+        return ""
+
+    @property
+    def commands(self) -> Dict[Tuple[str, str], Callable[..., Awaitable[str]]]:
+        return {
+            ("credential", "get"): self.credential_get,
+            ("credential", "erase"): self.credential_erase,
+            ("check", "list"): self.check_list,
+            ("check", "push"): self.check_push,
+            ("check", "update"): self.check_update,
+            ("check", "from-job-env"): self.check_from_job_env,
+        }
+
+    async def dispatch(self, request: dict) -> dict:
+        group, name, *args = request["argv"]
+
+        handler = self.commands.get((group, name))
+        if handler is None:
+            return dict(
+                exit=2, stdout="", stderr=f"Unsupported command: {group} {name}\n")
+
+        try:
+            command = cli.main.commands[group].commands[name]
+            params = command.make_context(name, args).params
+        except click.ClickException as e:
+            return dict(exit=e.exit_code, stdout="", stderr=e.format_message() + "\n")
+
+        try:
+            return dict(exit=0, stdout=await handler(request, **params), stderr="")
+        except Exception as e:
+            logger.exception("Error in command: %s", request["argv"])
+            return dict(exit=1, stdout="", stderr=f"{type(e).__name__}: {e}\n")
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        try:
+            request = json.loads((await reader.readline()).decode())
+            logger.info("request: %s", request["argv"])
+            response = await self.dispatch(request)
+        except Exception as e:
+            logger.exception("Invalid request.")
+            response = dict(
+                exit=1, stdout="", stderr=f"Invalid request: {e}\n",
+                error="invalid_request")
+
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+        writer.close()
+
+
+def _in_use(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+async def serve(app: AppIdentity, path: str):
+    """Serve daemon requests on the socket path until cancelled."""
+    if os.path.exists(path):
+        if _in_use(path):
+            raise ValueError(f"Daemon already listening on: {path}")
+        os.unlink(path)
+
+    app.installations.refresh_interval = INSTALLATIONS_REFRESH_INTERVAL
+
+    async with api.client_session() as session:
+        daemon = Daemon(app=app, session=session)
+
+        # Restrict socket to the current user, it vends credentials
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                daemon.handle, path=path, limit=MAX_REQUEST_SIZE)
+        finally:
+            os.umask(umask)
+
+        logger.info("Serving on: %s", path)
+        try:
+            await asyncio.get_event_loop().create_future()
+        finally:
+            server.close()
+            await server.wait_closed()
+            os.unlink(path)
@@ -0,0 +1,144 @@
+from typing import Dict, Optional, TYPE_CHECKING
+
+import logging
+
+import attr
+import aiohttp
+
+from .ratelimit import RateLimit, MAX_RATE_LIMIT_WAIT
+
+if TYPE_CHECKING:
+    from .identity import AppIdentity
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_LIMIT = 64
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+RATE_LIMIT_RETRIES = 3
+
+
+def client_session(**kwargs) -> aiohttp.ClientSession:
+    """A pooled client session, shared by all api requests of a process.
+
+    Connections to the api are kept alive between requests, DNS resolution is
+    cached and the number of open connections bounded. Sessions do not carry
+    auth, which is applied per request via `AppSession` or
+    `InstallationSession`.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+
+    return aiohttp.ClientSession(connector=connector, **kwargs)
+
+
+class _AuthedRequest:
+    """Awaitable, or async context manager, for a request with resolved auth.
+
+    Mirrors the interface of the `aiohttp.ClientSession` request methods.
+    """
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._resp = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._resp = await self._coro
+        return self._resp
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._resp.release()
+
+
+class _AuthedSession:
+    """A client session view applying auth headers to each request.
+
+    Requests are paced by the identity's `rate_limit`, and rate limited
+    requests retried if the required wait is under `MAX_RATE_LIMIT_WAIT`.
+    """
+
+    async def auth_headers(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+    @property
+    def rate_limit(self) -> RateLimit:
+        raise NotImplementedError
+
+    async def _request(self,
+                       method: str,
+                       url: str,
+                       headers: Optional[Dict[str, str]] = None,
+                       **kwargs) -> aiohttp.ClientResponse:
+        rate_limit = self.rate_limit
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await rate_limit.acquire()
+
+            request_headers = await self.auth_headers()
+            request_headers.update(headers or {})
+
+            resp = await self.session.request(
+                method, url, headers=request_headers, **kwargs)
+
+            limited = rate_limit.update(resp.status, resp.headers)
+            if (not limited or attempt == RATE_LIMIT_RETRIES
+                    or rate_limit.delay() > MAX_RATE_LIMIT_WAIT):
+                return resp
+
+            logger.info("Retrying rate limited request: %s %s", method, url)
+            resp.release()
+
+    def request(self, method: str, url: str, **kwargs) -> _AuthedRequest:
+        return _AuthedRequest(self._request(method, url, **kwargs))
+
+    def get(self, url: str, **kwargs) -> _AuthedRequest:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> _AuthedRequest:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> _AuthedRequest:
+        return self.request("PATCH", url, **kwargs)
+
+
+@attr.s(auto_attribs=True)
+class AppSession(_AuthedSession):
+    """A client session view authenticating requests as the app, via jwt."""
+    session: aiohttp.ClientSession
+    identity: "AppIdentity"
+
+    async def auth_headers(self) -> Dict[str, str]:
+        return self.identity.app_headers()
+
+    @property
+    def rate_limit(self) -> RateLimit:
+        return self.identity.rate_limits[None]
+
+
+@attr.s(auto_attribs=True)
+class InstallationSession(_AuthedSession):
+    """A client session view applying an installation's auth per request.
+
+    Allows a single, long-lived, `aiohttp.ClientSession` to be shared between
+    installations, resolving (cached) installation tokens for each request
+    rather than fixing auth in the session headers.
+    """
+    session: aiohttp.ClientSession
+    identity: "AppIdentity"
+    account: str
+
+    async def auth_headers(self) -> Dict[str, str]:
+        return await self.identity.installation_headers(
+            self.account, self.session)
+
+    @property
+    def rate_limit(self) -> RateLimit:
+        """Current request budget of the installation."""
+        return self.identity.rate_limits[self.account]
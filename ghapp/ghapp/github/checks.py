@@ -1,6 +1,7 @@
-from typing import Optional, List
+from typing import Iterable, Iterator, Optional, List, Tuple
 
 import aiohttp
+import itertools
 import logging
 
 import attr
@@ -8,9 +9,14 @@ import cattr
 import enum
 
 from ..cattrs import ignore_optional_none, ignore_unknown_attribs
+from .. import jsoncodec
+from .retry import RetryPolicy
+from .etagcache import ETagCache
+from .urls import api_url
 
 logger = logging.getLogger(__name__)
 api_headers = {"Accept": "application/vnd.github.antiope-preview+json"}
+json_headers = dict(api_headers, **{"Content-Type": "application/json"})
 
 
 class Status(enum.Enum):
@@ -28,14 +34,36 @@ class Conclusion(enum.Enum):
     action_required = "action_required"
 
 
+class AnnotationLevel(enum.Enum):
+    notice = "notice"
+    warning = "warning"
+    failure = "failure"
+
+
+@ignore_optional_none
+@ignore_unknown_attribs
+@attr.s(auto_attribs=True)
+class Annotation:
+    path: str
+    start_line: int
+    end_line: int
+    annotation_level: AnnotationLevel
+    message: str
+    start_column: Optional[int] = None
+    end_column: Optional[int] = None
+    title: Optional[str] = None
+    raw_details: Optional[str] = None
+
+
 @ignore_optional_none
 @ignore_unknown_attribs
 @attr.s(auto_attribs=True)
 class Output:
-    title: str
-    summary: str
+    # Null in responses for runs without output
+    title: Optional[str]
+    summary: Optional[str]
     text: Optional[str] = None
-    #annotations: List[Annotation]
+    annotations: Optional[List[Annotation]] = None
     #images: List[Image]
 
 
@@ -70,13 +98,62 @@ class CreateRun:
         assert self.run.head_sha is not None
         assert self.run.id is None
 
-        url = (f"https://api.github.com"
-               f"/repos/{self.owner}/{self.repo}/check-runs")
+        url = api_url(f"/repos/{self.owner}/{self.repo}/check-runs")
         body = cattr.unstructure(self.run)
 
         logger.info('POST %s\n%s', url, body)
 
-        return session.post(url, headers=api_headers, json=body)
+        return session.post(url, headers=json_headers, data=jsoncodec.dumpb(body))
+
+    async def find_existing(
+            self, session: aiohttp.ClientSession) -> Optional[RunDetails]:
+        """Find a previously created run with this run's external_id."""
+        if self.run.external_id is None:
+            return None
+
+        current_runs = await GetRuns(
+            owner=self.owner,
+            repo=self.repo,
+            ref=self.run.head_sha,
+            check_name=self.run.name,
+        ).execute(session)
+
+        for run in current_runs:
+            if run.external_id == self.run.external_id:
+                return run
+
+        return None
+
+    async def submit(
+            self,
+            session: aiohttp.ClientSession,
+            retry: RetryPolicy = RetryPolicy(),
+    ) -> RunDetails:
+        """Create the run, retrying transient failures.
+
+        A failed POST may have been applied by github, so retries first look
+        for an existing run with the same external_id, preventing duplicate
+        runs. Runs without an external_id can't be found, so are not retried.
+        """
+        if self.run.external_id is None:
+            async with self.execute(session) as resp:
+                return cattr.structure(await _checked_json(resp), RunDetails)
+
+        attempted = False
+
+        async def attempt():
+            nonlocal attempted
+            if attempted:
+                existing = await self.find_existing(session)
+                if existing is not None:
+                    logger.info("Found existing run: %s", existing.id)
+                    return existing
+            attempted = True
+
+            async with self.execute(session) as resp:
+                return cattr.structure(await _checked_json(resp), RunDetails)
+
+        return await retry.call(attempt)
 
 
 @attr.s(auto_attribs=True)
@@ -92,29 +169,175 @@ class UpdateRun:
         assert self.run.head_branch is None
         assert self.run.head_sha is None
 
-        url = (f"https://api.github.com"
-               f"/repos/{self.owner}/{self.repo}/check-runs/{self.run.id}")
+        url = api_url(
+            f"/repos/{self.owner}/{self.repo}/check-runs/{self.run.id}")
         body = cattr.unstructure(self.run)
 
         logger.info('PATCH %s\n%s', url, body)
 
-        return session.patch(url, headers=api_headers, json=body)
+        return session.patch(url, headers=json_headers, data=jsoncodec.dumpb(body))
+
+    async def submit(
+            self,
+            session: aiohttp.ClientSession,
+            retry: RetryPolicy = RetryPolicy(),
+    ) -> RunDetails:
+        """Update the run, retrying transient failures."""
+        async def attempt():
+            async with self.execute(session) as resp:
+                return cattr.structure(await _checked_json(resp), RunDetails)
+
+        return await retry.call(attempt)
+
+
+# Checks api limit on annotations per create or update request
+ANNOTATIONS_PER_REQUEST = 50
+
+
+@attr.s(auto_attribs=True)
+class UploadAnnotations:
+    """Stream annotations to an existing run, via successive `UpdateRun`s.
+
+    Annotations are consumed lazily, in batches of the api's per-request
+    limit, with at most `concurrency` requests in flight. Each update must
+    include the run's current `output` title and summary, but omits its text,
+    which is left unchanged.
+    """
+    owner: str
+    repo: str
+    run_id: str
+    name: str
+    output: Output
+    batch_size: int = ANNOTATIONS_PER_REQUEST
+    concurrency: int = 4
+
+    def batches(self, annotations: Iterable[Annotation]
+                ) -> Iterator[List[Annotation]]:
+        annotations = iter(annotations)
+        while True:
+            batch = list(itertools.islice(annotations, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    async def submit(
+            self,
+            session: aiohttp.ClientSession,
+            annotations: Iterable[Annotation],
+            retry: RetryPolicy = RetryPolicy(),
+    ) -> int:
+        """Upload annotations, returning the number uploaded."""
+        import asyncio
+
+        slots = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        uploaded = 0
+
+        async def upload(batch: List[Annotation]):
+            action = UpdateRun(
+                owner=self.owner,
+                repo=self.repo,
+                run=RunDetails(
+                    id=self.run_id,
+                    name=self.name,
+                    output=attr.evolve(
+                        self.output, text=None, annotations=batch),
+                ))
+            try:
+                await action.submit(session, retry)
+            finally:
+                slots.release()
+
+        try:
+            for batch in self.batches(annotations):
+                await slots.acquire()
+
+                for task in [t for t in pending if t.done()]:
+                    pending.remove(task)
+                    task.result()
+
+                pending.add(asyncio.ensure_future(upload(batch)))
+                uploaded += len(batch)
+
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        logger.info("Uploaded annotations: %s", uploaded)
+        return uploaded
+
+
+async def _checked_json(resp: aiohttp.ClientResponse) -> dict:
+    logger.debug(resp)
+
+    try:
+        resp.raise_for_status()
+    except aiohttp.ClientResponseError:
+        try:
+            message = (await resp.json(loads=jsoncodec.loads))["message"]
+        except Exception:
+            message = await resp.text()
+        logger.error("%s %s: %s", resp.method, resp.url, message)
+        raise
+
+    return await resp.json(loads=jsoncodec.loads)
+
 
 @attr.s(auto_attribs=True)
 class GetRuns:
-    """Check run input parameters from: https://developer.github.com/v3/checks/runs/"""
+    """List check runs for a ref, from: https://developer.github.com/v3/checks/runs/
+
+    All pages of the listing are fetched, the remaining pages concurrently
+    once the first page's `total_count` is known. `check_name` filters runs
+    by name server-side, fetching only the matching runs.
+
+    Pages are revalidated against `cache`, if provided, rather than
+    re-downloaded when unchanged.
+    """
     owner: str
     repo: str
     ref: str
+    check_name: Optional[str] = None
+    per_page: int = 100
+    cache: Optional[ETagCache] = attr.ib(default=None, repr=False, cmp=False)
 
     async def execute(self, session: aiohttp.ClientSession)->List[RunDetails]:
-        checks_url = (
-            f"https://api.github.com"
+        import asyncio
+
+        checks_url = api_url(
             f"/repos/{self.owner}/{self.repo}/commits/{self.ref}/check-runs")
 
-        async with session.get(checks_url, headers=api_headers) as resp:
-            logger.debug(resp)
-            resp.raise_for_status()
-            raw_result = await resp.json()
+        def parse_page(raw: dict) -> Tuple[int, List[RunDetails]]:
+            return (raw["total_count"],
+                    cattr.structure(raw["check_runs"], List[RunDetails]))
+
+        async def get_page(page: int) -> Tuple[int, List[RunDetails]]:
+            params = dict(per_page=self.per_page, page=page)
+            if self.check_name is not None:
+                params["check_name"] = self.check_name
+
+            if self.cache is not None:
+                key = (self.owner, self.repo, self.ref, self.check_name,
+                       self.per_page, page)
+                return await self.cache.get(
+                    key, session, checks_url, parse_page,
+                    headers=api_headers, params=params)
+
+            async with session.get(
+                    checks_url, headers=api_headers, params=params) as resp:
+                logger.debug(resp)
+                resp.raise_for_status()
+                return parse_page(await resp.json(loads=jsoncodec.loads))
+
+        total_count, first_runs = await get_page(1)
+        runs = list(first_runs)
+
+        num_pages = -(-total_count // self.per_page)
+        logger.debug("Listing check runs, pages: %s", num_pages)
+        for _, page_runs in await asyncio.gather(
+                *(get_page(p) for p in range(2, num_pages + 1))):
+            runs.extend(page_runs)
 
-            return cattr.structure(raw_result["check_runs"], List[RunDetails])
+        return runs
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import logging
+
+import attr
+
+from .. import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class ETagCache:
+    """LRU cache of parsed api responses, revalidated via their ETag.
+
+    Cached requests are sent with `If-None-Match`, and a `304 Not Modified`
+    response, which does not count against the rate limit, returns the
+    cached value. The least recently used entries are evicted beyond
+    `max_entries`.
+
+    See:
+        https://developer.github.com/v3/#conditional-requests
+    """
+    max_entries: int = 256
+    entries: "OrderedDict[Hashable, Tuple[str, Any]]" = attr.Factory(OrderedDict)
+    hits: int = 0
+    misses: int = 0
+
+    async def get(
+            self,
+            key: Hashable,
+            session,
+            url: str,
+            parse: Callable[[Any], Any],
+            headers: Optional[Dict[str, str]] = None,
+            **kwargs,
+    ) -> Any:
+        """GET url, returning parse(response json) or the cached value."""
+        headers = dict(headers or {})
+        entry = self.entries.get(key)
+        if entry is not None:
+            headers["If-None-Match"] = entry[0]
+
+        async with session.get(url, headers=headers, **kwargs) as resp:
+            logger.debug(resp)
+
+            if entry is not None and resp.status == 304:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[1]
+
+            resp.raise_for_status()
+            value = parse(await resp.json(loads=jsoncodec.loads))
+            self.misses += 1
+
+            etag = resp.headers.get("ETag")
+            if etag:
+                self.put(key, etag, value)
+
+            return value
+
+    def put(self, key: Hashable, etag: str, value: Any):
+        self.entries[key] = (etag, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses, entries=len(self.entries))
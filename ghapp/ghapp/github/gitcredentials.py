@@ -1,32 +1,116 @@
 import logging
-from typing import Callable, Awaitable
-from .identity import AppIdentity
+import os
+import time
+from typing import Callable, Awaitable, Dict, Optional, Tuple
 
-import aiohttp
+import attr
+
+from .identity import AppIdentity, InstallationToken, TokenCache
+from ..lockedfile import locked_json
 
 logger = logging.getLogger(__name__)
 
 
-async def credential_helper(credential_input: str,
-                      get_token_for_account: Callable[[str], Awaitable[str]]) -> str:
-    logger.info("credential_input: %s", credential_input)
+@attr.s(auto_attribs=True)
+class FileTokenCache(TokenCache):
+    """Installation token cache shared between processes via a locked file.
+
+    Backs the in-process `TokenCache` with a json file, allowing the many
+    short-lived `git credential` helper processes of a fetch to share tokens.
+    Enabled by the `GITHUB_APP_AUTH_TOKEN_CACHE` environment variable.
+    """
+    ENABLE_ENV_VAR = "GITHUB_APP_AUTH_TOKEN_CACHE"
+
+    path: Optional[str] = None
+
+    # Identity of the file version last read, skipping re-reads until changed
+    _file_version: Optional[Tuple[int, int, int]] = attr.ib(
+        default=None, init=False, repr=False)
+
+    def _version(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Files are atomically replaced, so a write changes the inode
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def for_app(cls, app_id: int) -> "FileTokenCache":
+        """Cache for the given app under `$XDG_CACHE_HOME/ghapp`."""
+        cache_home = os.getenv(
+            "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+
+        return cls(
+            path=os.path.join(cache_home, "ghapp", f"tokens-{app_id}.json"))
+
+    def get(self, account: str) -> Optional[dict]:
+        access_token = super().get(account)
+        if access_token is not None:
+            return access_token
+
+        # All tokens of a file are loaded, so an unchanged file has no token
+        version = self._version()
+        if version is None or version == self._file_version:
+            return None
+
+        with locked_json(self.path, exclusive=False) as tokens:
+            for k, access_token in tokens.items():
+                super().put(k, access_token)
+        self._file_version = version
+
+        logger.debug("Loaded cached tokens: %s", len(tokens))
+        return super().get(account)
+
+    def put(self, account: str, access_token: dict):
+        super().put(account, access_token)
+
+        with locked_json(self.path) as tokens:
+            tokens[account] = access_token
+
+            now = time.time()
+            for k in list(tokens):
+                expires_at = InstallationToken.from_response(
+                    tokens[k]).expires_at
+                if expires_at - self.refresh_margin <= now:
+                    del tokens[k]
 
+    def evict(self, account: str):
+        super().evict(account)
+
+        with locked_json(self.path) as tokens:
+            tokens.pop(account, None)
+
+
+def _parse_credential_input(
+        credential_input: str) -> Tuple[Dict[str, str], Optional[str]]:
+    """Parse git-credential input, resolving the github account if present."""
     cvals = dict(l.strip().split("=", 1) for l in credential_input.split("\n")
                  if l.strip())
     logger.debug("cvals: %s", cvals)
 
     if not cvals.get("host", None) == "github.com":
         logger.debug("Host does not match github.com")
-        return credential_input
+        return cvals, None
     if not cvals.get("protocol", "").startswith("http"):
         logger.debug("Protocol does not match http*")
-        return credential_input
+        return cvals, None
 
     if not cvals.get("path", ""):
         logger.debug("Not path provided.")
+        return cvals, None
+
+    return cvals, cvals.get("path", "").split("/")[0]
+
+
+async def credential_helper(credential_input: str,
+                      get_token_for_account: Callable[[str], Awaitable[str]]) -> str:
+    logger.info("credential_input: %s", credential_input)
+
+    cvals, account = _parse_credential_input(credential_input)
+    if account is None:
         return credential_input
 
-    account = cvals.get("path", "").split("/")[0]
     token = await get_token_for_account(account)
     if not token:
         return credential_input
@@ -35,3 +119,13 @@ async def credential_helper(credential_input: str,
     cvals["password"] = token
 
     return "\n".join("=".join(i) for i in cvals.items())
+
+
+def credential_erase(credential_input: str,
+                     evict_account: Callable[[str], None]):
+    """Evict the cached token for rejected credentials."""
+    logger.info("credential_input: %s", credential_input)
+
+    cvals, account = _parse_credential_input(credential_input)
+    if account is not None and cvals.get("username") == "x-access-token":
+        evict_account(account)
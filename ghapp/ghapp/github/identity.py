@@ -1,17 +1,70 @@
-from typing import Optional, Union, Dict
+from typing import Optional, Union, Dict, TYPE_CHECKING
 
+import datetime
 import os
 import time
 import logging
 
 import attr
-import jwt
 
-import aiohttp
+from .installations import InstallationIndex
+from .ratelimit import RateLimits
+from .urls import api_url
+
+# asyncio, aiohttp, jwt and cryptography are imported on use, keeping cli
+# startup fast for commands not requiring app auth.
+if TYPE_CHECKING:
+    import asyncio
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class InstallationToken:
+    """An installation access token response and its parsed expiry time."""
+    access_token: dict
+    expires_at: float
+
+    @classmethod
+    def from_response(cls, access_token: dict) -> "InstallationToken":
+        """Parse an `/access_tokens` response, with `expires_at` as ISO8601 utc."""
+        expires_at = datetime.datetime.strptime(
+            access_token["expires_at"], "%Y-%m-%dT%H:%M:%SZ").replace(
+                tzinfo=datetime.timezone.utc).timestamp()
+
+        return cls(access_token=access_token, expires_at=expires_at)
+
+
+@attr.s(auto_attribs=True)
+class TokenCache:
+    """In-process cache of installation access tokens, keyed by account.
+
+    Tokens are evicted `refresh_margin` seconds before their reported expiry,
+    so a cached token is never handed out just as it is about to expire.
+    """
+    refresh_margin: float = 5 * 60
+    tokens: Dict[str, InstallationToken] = attr.Factory(dict)
+
+    def get(self, account: str) -> Optional[dict]:
+        token = self.tokens.get(account)
+        if token is None:
+            return None
+
+        if token.expires_at - self.refresh_margin <= time.time():
+            logger.debug("Evicting expiring token for: %s", account)
+            del self.tokens[account]
+            return None
+
+        return token.access_token
+
+    def put(self, account: str, access_token: dict):
+        self.tokens[account] = InstallationToken.from_response(access_token)
+
+    def evict(self, account: str):
+        self.tokens.pop(account, None)
+
+
 @attr.s(frozen=True)
 class AppIdentity:
     """Manages a github app id/key pair and signed token generation.
@@ -26,6 +79,9 @@ class AppIdentity:
     APP_ID_ENV_VAR = "GITHUB_APP_AUTH_ID"
     PRIVATE_KEY_ENV_VAR = "GITHUB_APP_AUTH_KEY"
 
+    JWT_LIFETIME = 10 * 60
+    JWT_REFRESH_MARGIN = 60
+
     @staticmethod
     def _resolve_app_id(app_id: Optional[Union[int, str]] = None):
         """Resolve app id from int id or target file, falling back to `GH_APP_AUTH_ID`."""
@@ -77,21 +133,59 @@ class AppIdentity:
         repr=False,
         converter=_resolve_key.__func__,
         default=attr.Factory(lambda: AppIdentity._resolve_key()))
+    installations: InstallationIndex = attr.attrib(
+        default=attr.Factory(InstallationIndex), repr=False, cmp=False)
+    token_cache: TokenCache = attr.attrib(
+        default=attr.Factory(TokenCache), repr=False, cmp=False)
+    rate_limits: RateLimits = attr.attrib(
+        default=attr.Factory(RateLimits), repr=False, cmp=False)
+    _token_locks: Dict[str, "asyncio.Lock"] = attr.attrib(
+        default=attr.Factory(dict), init=False, repr=False, cmp=False)
+    _signing_cache: dict = attr.attrib(
+        default=attr.Factory(dict), init=False, repr=False, cmp=False)
+
+    def __attrs_post_init__(self):
+        self.installations.token_cache = self.token_cache
+
+    def signing_key(self):
+        """The parsed private key, loaded once and reused for all signatures."""
+        if "key" not in self._signing_cache:
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import serialization
+
+            self._signing_cache["key"] = serialization.load_pem_private_key(
+                self.private_key.encode(),
+                password=None,
+                backend=default_backend())
+
+        return self._signing_cache["key"]
 
     def jwt(self) -> str:
         """Generate JWT token for the app identity.
 
+        The signed token is reused until `JWT_REFRESH_MARGIN` seconds before
+        its expiry.
+
         See:
             https://developer.github.com/apps/building-github-apps/authenticating-with-github-apps/#authenticating-as-an-installation
         """
         issue_time = int(time.time())
+
+        token, expires_at = self._signing_cache.get("jwt", (None, 0))
+        if issue_time < expires_at - self.JWT_REFRESH_MARGIN:
+            return token
+
         payload = dict(
-            iat=issue_time, exp=issue_time + (10 * 60), iss=self.app_id)
+            iat=issue_time, exp=issue_time + self.JWT_LIFETIME, iss=self.app_id)
 
         logging.debug("Issuing app jwt: %s", payload)
 
-        return jwt.encode(
-            payload, self.private_key, algorithm='RS256').decode()
+        import jwt
+        token = jwt.encode(
+            payload, self.signing_key(), algorithm='RS256').decode()
+        self._signing_cache["jwt"] = (token, payload["exp"])
+
+        return token
 
     def app_headers(self) -> Dict[str, str]:
         return {
@@ -101,34 +195,60 @@ class AppIdentity:
 
     async def installation_token_for(
             self, account: str,
-            session: Optional[aiohttp.ClientSession] = None):
+            session: Optional["aiohttp.ClientSession"] = None):
+        """Resolve an access token for the account's installation, or None.
+
+        Tokens are served from `token_cache` until shortly before expiry, and
+        concurrent requests for an account share a single token generation.
+        """
+        access_token = self.token_cache.get(account)
+        if access_token is not None:
+            logger.debug("Using cached installation token for: %s", account)
+            return access_token
+
+        if account not in self._token_locks:
+            import asyncio
+            self._token_locks[account] = asyncio.Lock()
+
+        async with self._token_locks[account]:
+            access_token = self.token_cache.get(account)
+            if access_token is None:
+                access_token = await self._create_installation_token(
+                    account, session)
+                if access_token is not None:
+                    self.token_cache.put(account, access_token)
+
+        return access_token
+
+    async def _create_installation_token(
+            self, account: str,
+            session: Optional["aiohttp.ClientSession"] = None):
+        from . import api
+
         if session is None:
-            async with aiohttp.ClientSession(
-                    headers=self.app_headers(), ) as session:
-                return await self.installation_token_for(account, session)
+            async with api.client_session() as session:
+                return await self._create_installation_token(account, session)
 
-        async with session.get(
-                'https://api.github.com/app/installations') as resp:
-            resp.raise_for_status()
-            installations = await resp.json()
+        app_session = api.AppSession(session, self)
 
-        installation_id = {
-            i["account"]["login"]: i["id"]
-            for i in installations
-        }.get(account)
+        installation_id = await self.installations.installation_id(
+            account, app_session)
 
         if installation_id is None:
             return None
 
-        token_url = (f"https://api.github.com"
-                     f"/app/installations/{installation_id}/access_tokens")
+        token_url = api_url(
+            f"/app/installations/{installation_id}/access_tokens")
 
-        async with session.post(token_url) as resp:
+        async with app_session.post(token_url) as resp:
             resp.raise_for_status()
             return await resp.json()
 
-    async def installation_headers(self, account: str) -> Dict[str, str]:
-        access_token = await self.installation_token_for(account)
+    async def installation_headers(
+            self, account: str,
+            session: Optional["aiohttp.ClientSession"] = None
+    ) -> Dict[str, str]:
+        access_token = await self.installation_token_for(account, session)
         if access_token is None:
             raise ValueError(
                 f"Unable to resolve installation for owner: {account}")
@@ -0,0 +1,152 @@
+from typing import Dict, Optional, List, TYPE_CHECKING
+
+import logging
+import time
+
+import attr
+
+from .urls import api_url
+
+if TYPE_CHECKING:
+    import asyncio
+    import aiohttp
+    from .api import AppSession
+    from .identity import TokenCache
+
+logger = logging.getLogger(__name__)
+
+
+def last_page(resp: "aiohttp.ClientResponse") -> int:
+    """Resolve the final page number from a response's `Link` header."""
+    last = resp.links.get("last")
+    if last is None:
+        return 1
+
+    return int(last["url"].query.get("page", 1))
+
+
+@attr.s(auto_attribs=True)
+class InstallationIndex:
+    """An account login to installation id index for a github app.
+
+    The index is built by a single listing of `/app/installations`, fetching
+    all pages concurrently, on first use. Accounts missing from the index are
+    resolved individually, with accounts without an installation remembered
+    for `missing_ttl` seconds. The index may be kept current from
+    `installation` and `installation_repositories` webhook events via `hook`,
+    or, without webhooks, by re-listing every `refresh_interval` seconds.
+    Cached tokens of removed installations are evicted from `token_cache`.
+
+    See:
+        https://developer.github.com/v3/apps/#find-installations
+    """
+    per_page: int = 100
+    missing_ttl: float = 60
+    refresh_interval: Optional[float] = None
+    installations: Dict[str, int] = attr.Factory(dict)
+    missing: Dict[str, float] = attr.Factory(dict)
+    loaded: bool = False
+    loaded_at: float = 0
+    token_cache: Optional["TokenCache"] = attr.ib(default=None, repr=False)
+    _refresh_lock: Optional["asyncio.Lock"] = attr.ib(
+        default=None, init=False, repr=False)
+
+    async def installation_id(
+            self, account: str,
+            session: "AppSession") -> Optional[int]:
+        """Resolve installation id for account, via an app authed session."""
+        if self.stale():
+            # Concurrent lookups share a single listing
+            if self._refresh_lock is None:
+                import asyncio
+                self._refresh_lock = asyncio.Lock()
+
+            async with self._refresh_lock:
+                if self.stale():
+                    await self.refresh(session)
+
+        installation_id = self.installations.get(account)
+        if installation_id is not None:
+            return installation_id
+
+        if self.missing.get(account, 0) > time.monotonic():
+            return None
+        return await self.refresh_account(account, session)
+
+    def stale(self) -> bool:
+        """Check if the index requires a full listing."""
+        if not self.loaded:
+            return True
+        return (self.refresh_interval is not None and
+                time.monotonic() >= self.loaded_at + self.refresh_interval)
+
+    async def refresh(self, session: "AppSession"):
+        """Rebuild the index from a full, concurrently paginated, listing."""
+        import asyncio
+
+        url = api_url("/app/installations")
+
+        async def get_page(page: int) -> List[dict]:
+            params = dict(per_page=self.per_page, page=page)
+            async with session.get(url, params=params) as resp:
+                resp.raise_for_status()
+                return await resp.json()
+
+        async with session.get(url, params=dict(per_page=self.per_page)) as resp:
+            resp.raise_for_status()
+            installations = await resp.json()
+            num_pages = last_page(resp)
+
+        logger.debug("Listing installations, pages: %s", num_pages)
+        for page in await asyncio.gather(
+                *(get_page(p) for p in range(2, num_pages + 1))):
+            installations.extend(page)
+
+        listed = {i["account"]["login"]: i["id"] for i in installations}
+        for account in set(self.installations) - set(listed):
+            self.remove(account)
+
+        self.installations = listed
+        self.missing.clear()
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+        logger.info("Indexed installations: %s", len(self.installations))
+
+    async def refresh_account(
+            self, account: str,
+            session: "AppSession") -> Optional[int]:
+        """Resolve and index the installation for a single account."""
+        url = api_url(f"/users/{account}/installation")
+
+        async with session.get(url) as resp:
+            if resp.status == 404:
+                logger.info("No installation for account: %s", account)
+                self.remove(account)
+                self.missing[account] = time.monotonic() + self.missing_ttl
+                return None
+
+            resp.raise_for_status()
+            installation = await resp.json()
+
+        self.installations[account] = installation["id"]
+        return installation["id"]
+
+    def remove(self, account: str):
+        """Remove an account's installation, evicting its cached token."""
+        self.installations.pop(account, None)
+        if self.token_cache is not None:
+            self.token_cache.evict(account)
+
+    async def hook(self, name: str, body: dict):
+        """Update index from an `installation*` webhook event."""
+        installation = body["installation"]
+        account = installation["account"]["login"]
+
+        if name == "installation" and body["action"] in ("deleted", "suspend"):
+            logger.info("Removing installation for account: %s", account)
+            self.remove(account)
+        else:
+            logger.info("Indexing installation for account: %s", account)
+            self.installations[account] = installation["id"]
+            self.missing.pop(account, None)
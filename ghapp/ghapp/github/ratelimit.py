@@ -0,0 +1,114 @@
+from typing import Dict, Mapping, Optional
+
+import logging
+import time
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+# Longest rate limit wait before failing a request, rather than retrying.
+MAX_RATE_LIMIT_WAIT = 60
+
+
+@attr.s(auto_attribs=True)
+class RateLimit:
+    """Request budget for a single rate limited identity.
+
+    Tracks the `X-RateLimit-*` headers of api responses, and secondary rate
+    limit `Retry-After` responses. Requests are spaced evenly over the time
+    remaining until reset once less than `reserve` of the limit remains, and
+    blocked entirely once the budget is exhausted.
+
+    See:
+        https://developer.github.com/v3/#rate-limiting
+        https://developer.github.com/v3/#abuse-rate-limits
+    """
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset: float = 0
+    retry_after: float = 0
+
+    reserve: float = 0.1
+
+    _next_request: float = 0
+
+    def update(self, status: int, headers: Mapping[str, str]) -> bool:
+        """Update from response, returning True if it was rate limited.
+
+        Responses without rate limit headers are counted against the
+        remaining budget, except `304 Not Modified` responses to conditional
+        requests, which github doesn't count.
+        """
+        if "X-RateLimit-Remaining" in headers:
+            self.limit = int(headers["X-RateLimit-Limit"])
+            self.remaining = int(headers["X-RateLimit-Remaining"])
+            self.reset = float(headers["X-RateLimit-Reset"])
+        elif status != 304 and self.remaining:
+            self.remaining -= 1
+
+        if status not in (403, 429):
+            return False
+
+        if "Retry-After" in headers:
+            self.retry_after = time.time() + float(headers["Retry-After"])
+            logger.warning("Secondary rate limit, retry after: %ss",
+                           headers["Retry-After"])
+            return True
+
+        if self.remaining == 0:
+            logger.warning("Rate limit exhausted, reset at: %s", self.reset)
+            return True
+
+        return False
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until the next request may be sent."""
+        if now is None:
+            now = time.time()
+
+        start = max(now, self.retry_after, self._next_request)
+        if self.remaining is not None and self.remaining <= 0:
+            start = max(start, self.reset)
+
+        return start - now
+
+    def spacing(self, now: float) -> float:
+        """Interval between requests, given the budget remaining until reset."""
+        if self.remaining is None or self.limit is None or now >= self.reset:
+            return 0
+        if self.remaining >= self.limit * self.reserve:
+            return 0
+
+        return (self.reset - now) / max(self.remaining, 1)
+
+    async def acquire(self):
+        """Wait until a request may be sent within the budget."""
+        import asyncio
+
+        now = time.time()
+        delay = self.delay(now)
+
+        self._next_request = now + delay + self.spacing(now)
+
+        if delay > 0:
+            logger.info("Rate limited, waiting: %.2fs", delay)
+            await asyncio.sleep(delay)
+
+
+@attr.s(auto_attribs=True)
+class RateLimits:
+    """Rate limit budgets of an app, keyed by installation account.
+
+    App jwt authenticated requests are tracked under the `None` key.
+    """
+    limits: Dict[Optional[str], RateLimit] = attr.Factory(dict)
+
+    def __getitem__(self, account: Optional[str]) -> RateLimit:
+        if account not in self.limits:
+            self.limits[account] = RateLimit()
+        return self.limits[account]
+
+    def budget(self) -> Dict[Optional[str], Optional[int]]:
+        """Requests remaining for each tracked installation."""
+        return {k: v.remaining for k, v in self.limits.items()}
@@ -0,0 +1,78 @@
+from typing import Awaitable, Callable, Mapping, TypeVar
+
+import asyncio
+import logging
+import random
+import time
+
+import attr
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ATTEMPTS_ENV_VAR = "GHAPP_RETRY_ATTEMPTS"
+DEADLINE_ENV_VAR = "GHAPP_RETRY_DEADLINE"
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors that may succeed on retry: server errors, timeouts & network."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class RetryPolicy:
+    """Retry with jittered exponential backoff, within an overall deadline.
+
+    Attempt `n` is followed by a delay drawn uniformly from
+    `[0, min(max_delay, base_delay * 2 ** n)]` ("full jitter"). Attempts are
+    cancelled, and no further attempts made, once `deadline` seconds have
+    elapsed since the first attempt.
+    """
+    attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 10
+    deadline: float = 60
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str]) -> "RetryPolicy":
+        """Policy configured via $GHAPP_RETRY_ATTEMPTS/$GHAPP_RETRY_DEADLINE."""
+        policy = cls()
+        if environ.get(ATTEMPTS_ENV_VAR):
+            policy = attr.evolve(
+                policy, attempts=max(int(environ[ATTEMPTS_ENV_VAR]), 1))
+        if environ.get(DEADLINE_ENV_VAR):
+            policy = attr.evolve(
+                policy, deadline=float(environ[DEADLINE_ENV_VAR]))
+        return policy
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Await func(), retrying on transient errors."""
+        start = time.monotonic()
+
+        for attempt in range(self.attempts):
+            remaining = self.deadline - (time.monotonic() - start)
+
+            try:
+                return await asyncio.wait_for(func(), timeout=remaining)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+
+                delay = self.backoff(attempt)
+                elapsed = time.monotonic() - start
+                if (attempt + 1 == self.attempts
+                        or elapsed + delay >= self.deadline):
+                    logger.warning("Failed after %s attempts: %r",
+                                   attempt + 1, e)
+                    raise
+
+                logger.info("Retrying in %.2fs after: %r", delay, e)
+                await asyncio.sleep(delay)
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import logging
+import time
+
+import attr
+
+from .checks import RunDetails
+
+logger = logging.getLogger(__name__)
+
+CommitKey = Tuple[str, str, str]
+
+
+@attr.s(auto_attribs=True)
+class CommitRuns:
+    """Check run ids of a commit, by external id."""
+    runs: Dict[str, str] = attr.Factory(dict)
+
+    # Set after a full listing of the commit's runs has been indexed, until
+    # which runs missing from the index are assumed not to exist.
+    complete_until: float = 0
+
+    @property
+    def complete(self) -> bool:
+        return time.monotonic() < self.complete_until
+
+
+@attr.s(auto_attribs=True)
+class RunIndex:
+    """An (owner, repo, head_sha) to {external_id: run id} index of check runs.
+
+    The index is fed by the app's own create/update responses, full run
+    listings and `check_run` webhook events, resolving create-vs-update for
+    job events without an api request. Commits are evicted least recently
+    used beyond `max_commits`.
+
+    A full listing marks runs missing from the index as absent for
+    `complete_ttl` seconds, after which a run must be listed again, as it may
+    have been created elsewhere (eg. by another server process) since. A
+    `complete_ttl` of 0 never treats runs as absent.
+
+    If `app_id` is provided, `check_run` events of other apps are ignored.
+    """
+    app_id: Optional[int] = None
+    max_commits: int = 1024
+    complete_ttl: float = 60
+    commits: "OrderedDict[CommitKey, CommitRuns]" = attr.Factory(OrderedDict)
+    hits: int = 0
+    misses: int = 0
+
+    def _commit(self, key: CommitKey) -> CommitRuns:
+        if key not in self.commits:
+            self.commits[key] = CommitRuns()
+        self.commits.move_to_end(key)
+
+        while len(self.commits) > self.max_commits:
+            self.commits.popitem(last=False)
+
+        return self.commits[key]
+
+    def lookup(self, owner: str, repo: str, sha: str,
+               external_id: str) -> Tuple[Optional[str], bool]:
+        """Lookup (run id, known) for a run, known if its id or absence is indexed."""
+        commit = self.commits.get((owner, repo, sha))
+        if commit is None:
+            return None, False
+
+        self.commits.move_to_end((owner, repo, sha))
+        run_id = commit.runs.get(external_id)
+        return run_id, run_id is not None or commit.complete
+
+    def resolve(self, owner: str, repo: str, sha: str,
+                external_id: str) -> Tuple[Optional[str], bool]:
+        """Lookup a run, counting index hits and misses."""
+        run_id, known = self.lookup(owner, repo, sha, external_id)
+        if known:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return run_id, known
+
+    def add(self, owner: str, repo: str, sha: str, run: RunDetails):
+        if run.external_id is None or run.id is None:
+            return
+        self._commit((owner, repo, sha)).runs[run.external_id] = run.id
+
+    def add_listing(self, owner: str, repo: str, sha: str,
+                    runs: Iterable[RunDetails]):
+        """Index a full listing of a commit's runs."""
+        for run in runs:
+            self.add(owner, repo, sha, run)
+        self._commit((owner, repo, sha)).complete_until = (
+            time.monotonic() + self.complete_ttl)
+
+    async def hook(self, name: str, body: dict):
+        """Index runs from `check_run` webhook events."""
+        assert name == "check_run"
+
+        check_run = body["check_run"]
+        if self.app_id is not None and check_run["app"]["id"] != self.app_id:
+            return
+
+        repo = body["repository"]
+        self.add(
+            repo["owner"]["login"], repo["name"], check_run["head_sha"],
+            RunDetails(
+                name=check_run["name"],
+                id=str(check_run["id"]),
+                external_id=check_run.get("external_id") or None,
+            ))
+
+    def stats(self) -> Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses, commits=len(self.commits))
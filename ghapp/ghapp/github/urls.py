@@ -0,0 +1,10 @@
+"""Github api base url, configurable for github enterprise or a local api."""
+import os
+
+API_URL_ENV_VAR = "GITHUB_API_URL"
+DEFAULT_API_URL = "https://api.github.com"
+
+
+def api_url(path: str = "") -> str:
+    """Api url for path, under $GITHUB_API_URL if set."""
+    return os.getenv(API_URL_ENV_VAR, DEFAULT_API_URL).rstrip("/") + path
@@ -3,12 +3,17 @@ from typing import Optional, Union
 import logging
 import hmac
 import os
+from urllib.parse import parse_qs
 
 import attr
 
 from aiohttp import web
 
 from ..signalset import SignalSet
+from .. import jsoncodec
+from ..webhooks import (
+    MAX_BODY_SIZE, BodyTooLarge, DeliverySet, process_once, read_body,
+    too_large)
 
 logger = logging.getLogger(__name__)
 
@@ -47,27 +52,54 @@ class GithubHooks:
 
     signals: SignalSet = attr.Factory(SignalSet)
 
-    async def handler(self, req: web.Request):
-        # Get and validate signature
-        sig = req.headers.get('x-hub-signature')
-        if sig:
-            raw_body = await req.read()
-
-            mac = hmac.new(self.secret, msg=raw_body, digestmod='sha1')
-            local_sig = "sha1=" + mac.hexdigest()
+    max_body_size: int = MAX_BODY_SIZE
+    deliveries: DeliverySet = attr.Factory(DeliverySet)
 
-            logger.info("x-hub-sig: %s", sig)
-            logger.info("payload-sig: %s", local_sig)
+    SIGNATURE_HEADERS = (
+        ("x-hub-signature-256", "sha256"),
+        ("x-hub-signature", "sha1"),
+    )
 
-            if not sig == local_sig:
-                return web.Response(status=401, text="invalid x-hub-signature")
-
-        # Get body and unpack content type
-        logger.info("content-type: %s", req.headers["content-type"])
-        if req.headers["content-type"] == "application/x-www-form-urlencoded":
-            body = (await req.post())["payload"]
+    async def handler(self, req: web.Request):
+        # Acknowledge redeliveries without processing
+        return await process_once(
+            self.deliveries, req.headers.get("x-github-delivery"),
+            lambda: self.process(req))
+
+    async def process(self, req: web.Request):
+        # Get signature, preferring sha256, rejecting unsigned deliveries
+        for header, digestmod in self.SIGNATURE_HEADERS:
+            sig = req.headers.get(header)
+            if sig:
+                break
         else:
-            body = await req.json()
+            return web.Response(status=401, text="missing x-hub-signature")
+
+        # Read body, computing the signature in the same pass
+        mac = hmac.new(self.secret, digestmod=digestmod)
+        try:
+            raw_body = await read_body(req, mac, self.max_body_size)
+        except BodyTooLarge:
+            return too_large(self.max_body_size)
+
+        local_sig = f"{digestmod}=" + mac.hexdigest()
+        logger.debug("%s: %s", header, sig)
+        logger.debug("payload-sig: %s", local_sig)
+
+        if not hmac.compare_digest(sig.encode(), local_sig.encode()):
+            return web.Response(status=401, text=f"invalid {header}")
+
+        # Decode body by content type
+        content_type = req.content_type
+        logger.debug("content-type: %s", content_type)
+        try:
+            if content_type == "application/x-www-form-urlencoded":
+                payload = parse_qs(raw_body.decode())["payload"][0]
+                body = jsoncodec.loads(payload)
+            else:
+                body = jsoncodec.loads(raw_body)
+        except (KeyError, UnicodeDecodeError, ValueError):
+            return web.Response(status=400, text="invalid payload")
 
         name = req.headers['x-github-event']
         logger.debug("name: %s", name)
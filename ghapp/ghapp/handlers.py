@@ -108,18 +108,27 @@ def job_environ_to_check_action(
     }.get(run.name)
 
     if current_check_by_name is not None:
-        run.id = current_check_by_name.id
-        run.head_sha = None
-        run.head_branch = None
-        return checks.UpdateRun(
-            repo = repo.repo, owner=repo.owner, run = run
-        )
+        return job_environ_to_update_action(job, current_check_by_name.id)
     else:
         return checks.CreateRun(
             repo = repo.repo, owner=repo.owner, run = run
         )
 
 
+def job_environ_to_update_action(
+        job: jobs.JobEnviron,
+        run_id: str,
+) -> checks.UpdateRun:
+    run = job_environ_to_run_details(job)
+    repo = RepoName.parse(job.BUILDKITE_REPO)
+
+    run.id = run_id
+    run.head_sha = None
+    run.head_branch = None
+
+    return checks.UpdateRun(repo=repo.repo, owner=repo.owner, run=run)
+
+
 def job_environ_to_run_details(job: jobs.JobEnviron) -> checks.RunDetails:
     assert job.BUILDKITE
     assert job.CI
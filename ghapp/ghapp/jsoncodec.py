@@ -0,0 +1,91 @@
+"""JSON encoding and decoding of webhook and api payloads.
+
+Uses the fastest installed of `orjson` or `ujson`, falling back to the
+standard library `json`. Set `$GHAPP_JSON_CODEC` to one of `CODECS` to
+select a codec explicitly.
+"""
+from typing import Any, Callable, List, Optional, Union
+
+import json
+import os
+
+import attr
+
+CODEC_ENV_VAR = "GHAPP_JSON_CODEC"
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Codec:
+    name: str
+    loads: Callable[[Union[str, bytes]], Any]
+    dumpb: Callable[[Any], bytes]
+
+
+def _orjson() -> Codec:
+    import orjson
+    return Codec("orjson", orjson.loads, orjson.dumps)
+
+
+def _ujson() -> Codec:
+    import ujson
+
+    def dumpb(obj) -> bytes:
+        return ujson.dumps(
+            obj, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+    return Codec("ujson", ujson.loads, dumpb)
+
+
+def _stdlib() -> Codec:
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    return Codec("json", json.loads, dumpb)
+
+
+# Codec loaders, in order of preference
+CODECS = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _stdlib,
+}
+
+
+def available() -> List[Codec]:
+    """Installed codecs, in order of preference, importing all of them."""
+    codecs = []
+    for load in CODECS.values():
+        try:
+            codecs.append(load())
+        except ImportError:
+            pass
+    return codecs
+
+
+def select(name: Optional[str] = None) -> Codec:
+    """Load the named codec, or the preferred installed codec.
+
+    Only codecs up to the selected codec are imported.
+    """
+    if name is None:
+        for load in CODECS.values():
+            try:
+                return load()
+            except ImportError:
+                pass
+
+    if name not in CODECS:
+        raise ValueError(
+            f"Unknown json codec: {name!r}, expected one of: {list(CODECS)}")
+    return CODECS[name]()
+
+
+codec = select(os.environ.get(CODEC_ENV_VAR) or None)
+
+
+def loads(s: Union[str, bytes]) -> Any:
+    return codec.loads(s)
+
+
+def dumpb(obj: Any) -> bytes:
+    return codec.dumpb(obj)
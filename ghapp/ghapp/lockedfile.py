@@ -0,0 +1,50 @@
+import contextlib
+import copy
+import fcntl
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def locked_json(path: str, exclusive: bool = True):
+    """Load a json object file under an advisory lock, yielding a dict.
+
+    Multiple processes may read under a shared lock, writers take an exclusive
+    lock. If opened exclusively, modifications to the yielded dict are written
+    back via atomic replace, so readers never observe partial files. Files are
+    created with user-only permissions.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, mode=0o700, exist_ok=True)
+
+    lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+        try:
+            with open(path, "r") as inf:
+                data = json.load(inf)
+        except FileNotFoundError:
+            data = {}
+        except ValueError:
+            logger.warning("Ignoring invalid json file: %s", path)
+            data = {}
+
+        original = copy.deepcopy(data)
+        yield data
+
+        if exclusive and data != original:
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as outf:
+                    json.dump(data, outf)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+    finally:
+        os.close(lock_fd)
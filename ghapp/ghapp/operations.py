@@ -0,0 +1,370 @@
+"""Github operations shared by the cli and daemon.
+
+Operations are executed against an app identity and a (possibly long-lived)
+client session, returning their output rather than printing it.
+"""
+from typing import (
+    AsyncIterator, Dict, Iterable, List, Optional, Mapping, Tuple)
+
+import contextlib
+import json
+import logging
+import os
+import uuid
+
+import attr
+import cattr
+import aiohttp
+
+from .github.identity import AppIdentity
+from .github.api import InstallationSession
+from .github import checks
+from .github.retry import RetryPolicy
+from .github.etagcache import ETagCache
+from .github.urls import api_url
+from .github.gitcredentials import credential_helper
+from . import problems
+from .output import OutputLimits
+
+from .buildkite import jobs
+from .buildkite.runstate import RunState
+from .handlers import (
+    RepoName,
+    job_environ_to_check_action,
+    job_environ_to_update_action,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def credential_get(
+        app: AppIdentity,
+        credential_input: str,
+        session: Optional[aiohttp.ClientSession] = None,
+) -> str:
+    # https://git-scm.com/docs/git-credential
+    async def token_for(account):
+        access_token = await app.installation_token_for(account, session)
+        return access_token["token"] if access_token else None
+
+    return await credential_helper(credential_input, token_for) + "\n"
+
+
+async def check_list(
+        app: AppIdentity,
+        session: aiohttp.ClientSession,
+        repo: str,
+        ref: str,
+        name: Optional[str] = None,
+        cache: Optional[ETagCache] = None,
+) -> List[checks.RunDetails]:
+    repo = RepoName.parse(repo)
+    sesh = InstallationSession(session, app, repo.owner)
+
+    return await checks.GetRuns(
+        owner=repo.owner,
+        repo=repo.repo,
+        ref=ref,
+        check_name=name,
+        cache=cache,
+    ).execute(sesh)
+
+
+async def check_push(
+        app: AppIdentity,
+        session: aiohttp.ClientSession,
+        repo: str,
+        branch: str,
+        name: str,
+        sha: Optional[str] = None,
+        output: Optional[checks.Output] = None,
+        retry: RetryPolicy = RetryPolicy(),
+) -> dict:
+    repo = RepoName.parse(repo)
+    sesh = InstallationSession(session, app, repo.owner)
+
+    if not sha:
+        logger.info("Resolving branch sha: %s", branch)
+        ref_url = api_url(
+            f"/repos/{repo.owner}/{repo.repo}/git/refs/heads/{branch}")
+        logger.debug(ref_url)
+        async with sesh.get(ref_url) as resp:
+            logger.info(resp)
+            sha = (await resp.json())["object"]["sha"]
+
+    action = checks.CreateRun(
+        owner=repo.owner,
+        repo=repo.repo,
+        run=checks.RunDetails(
+            head_branch=branch,
+            head_sha=sha,
+            name=name,
+            status=checks.Status.in_progress,
+            output=output,
+            # Identifies the run if a retried create was already applied
+            external_id=str(uuid.uuid4()),
+        ))
+
+    return cattr.unstructure(await action.submit(sesh, retry))
+
+
+async def check_update(
+        app: AppIdentity,
+        session: aiohttp.ClientSession,
+        repo: str,
+        id: str,
+        name: str,
+        retry: RetryPolicy = RetryPolicy(),
+) -> dict:
+    repo = RepoName.parse(repo)
+    sesh = InstallationSession(session, app, repo.owner)
+
+    action = checks.UpdateRun(
+        owner=repo.owner,
+        repo=repo.repo,
+        run=checks.RunDetails(
+            id=id,
+            name=name,
+            status=checks.Status.in_progress,
+        ))
+
+    return cattr.unstructure(await action.submit(sesh, retry))
+
+
+async def check_apply(
+        app: AppIdentity,
+        session: aiohttp.ClientSession,
+        lines: Iterable[str],
+        concurrency: int = 16,
+        retry: RetryPolicy = RetryPolicy(),
+) -> AsyncIterator[dict]:
+    """Create or update check runs from json lines, yielding results.
+
+    Each line is a `checks.RunDetails` record, with an additional "repo".
+    Records without an id are matched to existing runs by external_id, or
+    name, via a single listing of each commit's runs, to which created runs
+    are added. Records for the same run are applied in order, so a later
+    record updates a run created by an earlier one. At most `concurrency`
+    records are in flight, and results are yielded as they complete, tagged
+    with the record's line number. Lines are read in an executor, so a slow
+    input doesn't block the event loop.
+    """
+    import asyncio
+
+    loop = asyncio.get_event_loop()
+    listings: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    # The last record applied to each run, by id or commit and match key
+    applying: Dict[tuple, asyncio.Future] = {}
+
+    def current_runs(repo: RepoName, sha: str,
+                     sesh: InstallationSession) -> asyncio.Future:
+        key = (repo.owner, repo.repo, sha)
+        if key not in listings:
+            listings[key] = asyncio.ensure_future(
+                retry.call(lambda: checks.GetRuns(
+                    owner=repo.owner, repo=repo.repo, ref=sha).execute(sesh)))
+        return listings[key]
+
+    def run_key(repo: RepoName, run: checks.RunDetails) -> tuple:
+        if run.id is not None:
+            return (repo.owner, repo.repo, "id", run.id)
+        if run.external_id is not None:
+            return (repo.owner, repo.repo, run.head_sha,
+                    "external_id", run.external_id)
+        return (repo.owner, repo.repo, run.head_sha, "name", run.name)
+
+    def matches(run: checks.RunDetails, existing: checks.RunDetails) -> bool:
+        if run.external_id is not None:
+            return existing.external_id == run.external_id
+        return existing.name == run.name
+
+    async def apply_run(repo: RepoName, run: checks.RunDetails,
+                        sesh: InstallationSession) -> Tuple[str, dict]:
+        if run.id is None:
+            if run.head_sha is None:
+                raise ValueError("Record requires an id or head_sha.")
+            for existing in await current_runs(repo, run.head_sha, sesh):
+                if matches(run, existing):
+                    run.id = existing.id
+                    break
+
+        if run.id is None:
+            if run.head_branch is None:
+                raise ValueError("Record requires a head_branch to create.")
+            if run.external_id is None:
+                run.external_id = str(uuid.uuid4())
+            result = await checks.CreateRun(
+                owner=repo.owner, repo=repo.repo, run=run).submit(sesh, retry)
+            (await current_runs(repo, run.head_sha, sesh)).append(result)
+            return "create", result
+
+        run.head_sha = None
+        run.head_branch = None
+        result = await checks.UpdateRun(
+            owner=repo.owner, repo=repo.repo, run=run).submit(sesh, retry)
+        return "update", result
+
+    async def apply(line_number: int, line: str) -> dict:
+        applied = loop.create_future()
+        key = None
+        try:
+            record = json.loads(line)
+            repo = RepoName.parse(record.pop("repo"))
+            run = cattr.structure(record, checks.RunDetails)
+            sesh = InstallationSession(session, app, repo.owner)
+
+            # Wait for the previous record for this run to be applied
+            key = run_key(repo, run)
+            previous = applying.get(key)
+            applying[key] = applied
+            if previous is not None:
+                await previous
+
+            action, result = await apply_run(repo, run, sesh)
+            return dict(
+                line=line_number,
+                action=action,
+                run=cattr.unstructure(result),
+            )
+        except Exception as e:
+            logger.warning("Error applying line %s: %r", line_number, e)
+            return dict(line=line_number, error=f"{type(e).__name__}: {e}")
+        finally:
+            applied.set_result(None)
+            if applying.get(key) is applied:
+                del applying[key]
+
+    lines = iter(lines)
+    line_number = 0
+    pending = set()
+    while True:
+        line = await loop.run_in_executor(None, next, lines, None)
+        if line is None:
+            break
+        line_number += 1
+
+        if not line.strip():
+            continue
+
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+        pending.add(asyncio.ensure_future(apply(line_number, line)))
+
+    while pending:
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+
+async def check_from_job_env(
+        app: AppIdentity,
+        session: aiohttp.ClientSession,
+        environ: Mapping[str, str],
+        output: Optional[checks.Output] = None,
+        retry: RetryPolicy = RetryPolicy(),
+        cache: Optional[ETagCache] = None,
+        annotations: Optional[Iterable[checks.Annotation]] = None,
+) -> dict:
+    job_env = cattr.structure(dict(environ), jobs.JobEnviron)
+    logger.info("job_env: %s", job_env)
+
+    repo = RepoName.parse(job_env.BUILDKITE_REPO)
+    sesh = InstallationSession(session, app, repo.owner)
+
+    # Run id recorded by a previous hook of this job, skipping the lookup
+    run_state = None
+    run_id = None
+    if job_env.BUILDKITE_BUILD_CHECKOUT_PATH:
+        run_state = RunState.for_checkout(job_env.BUILDKITE_BUILD_CHECKOUT_PATH)
+        run_id = run_state.get(job_env.BUILDKITE_JOB_ID)
+
+    if run_id is not None:
+        logger.info("Recorded run id: %s", run_id)
+        check_action = job_environ_to_update_action(job_env, run_id)
+    else:
+        current_runs = await retry.call(lambda: checks.GetRuns(
+            owner=repo.owner,
+            repo=repo.repo,
+            ref=job_env.BUILDKITE_COMMIT,
+            check_name=job_env.BUILDKITE_LABEL,
+            cache=cache,
+        ).execute(sesh))
+        logger.info("current_runs: %s", current_runs)
+
+        check_action = job_environ_to_check_action(job_env, current_runs)
+
+    if output:
+        check_action.run.output = output
+
+    logger.info("action: %s", check_action)
+
+    result = await check_action.submit(sesh, retry)
+
+    if run_state is not None and run_id is None:
+        run_state.put(job_env.BUILDKITE_JOB_ID, result.id)
+
+    if annotations is not None:
+        # Updates require a title and summary, keep the run's current output
+        output = result.output or checks.Output(title=None, summary=None)
+        await checks.UploadAnnotations(
+            owner=repo.owner,
+            repo=repo.repo,
+            run_id=result.id,
+            name=result.name,
+            output=attr.evolve(
+                output,
+                title=output.title or result.name,
+                summary=output.summary or "Problems reported by the job."),
+        ).submit(sesh, annotations, retry)
+
+    return cattr.unstructure(result)
+
+
+@contextlib.contextmanager
+def load_job_annotations(annotate, problem_matchers, root="", cwd=None):
+    """Lazily parse annotations from a tool output file, if provided."""
+    if not annotate:
+        yield None
+        return
+
+    path = os.path.join(cwd, annotate) if cwd else annotate
+    matchers = [problems.ProblemMatcher.resolve(m) for m in problem_matchers]
+
+    logger.info("Reading annotations: %s", path)
+    with open(path, "r", errors="replace") as inf:
+        yield problems.parse_annotations(inf, matchers, root)
+
+
+def load_job_output(output_title, output_summary, output, cwd=None,
+                    limits: Optional[OutputLimits] = None):
+    """Loads job output (maybe) from files, relative to cwd if provided.
+
+    Output is truncated to the `limits` head and tail, reading only the
+    retained portions of files.
+    """
+    if limits is None:
+        limits = OutputLimits()
+
+    def read_if_file(val):
+        path = os.path.join(cwd, val) if cwd else val
+        if os.path.exists(path):
+            logger.info("Reading file: %s", path)
+            return limits.load(path)
+        else:
+            return limits.truncate(val)
+
+    if output_title:
+        assert output_summary
+        return checks.Output(
+            title = output_title,
+            summary = read_if_file(output_summary),
+            text = read_if_file(output) if output else None
+        )
+    else:
+        return None
@@ -0,0 +1,103 @@
+"""Bounded loading of check run output from (possibly very large) files.
+
+The checks api rejects output summary or text over `MAX_OUTPUT_CHARS`.
+Rather than reading whole build logs, only the head and tail of a file are
+read, via mmap, and joined by a marker noting the truncated size. Cuts are
+made on utf-8 character boundaries.
+"""
+from typing import Mapping, Tuple
+
+import logging
+import mmap
+import os
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+# Checks api limit on output summary and text length
+MAX_OUTPUT_CHARS = 65535
+
+# Allowance for the truncation marker, and utf-8 boundary adjustment
+MARKER_RESERVE = 256
+
+HEAD_ENV_VAR = "GHAPP_OUTPUT_HEAD"
+TAIL_ENV_VAR = "GHAPP_OUTPUT_TAIL"
+
+
+def _utf8_boundary(buf, pos: int) -> int:
+    """Move pos back to the start of the utf-8 character containing it."""
+    while 0 < pos < len(buf) and (buf[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class OutputLimits:
+    """Bytes retained from the head and tail of output exceeding the limit.
+
+    Output is mostly logs, where the tail (eg. test failures) is most useful,
+    so the majority of the budget is assigned to the tail by default.
+    """
+    head: int = attr.ib(default=16 * 1024)
+    tail: int = attr.ib(default=MAX_OUTPUT_CHARS - MARKER_RESERVE - 16 * 1024)
+
+    @head.validator
+    @tail.validator
+    def _check(self, attribute, value):
+        if value < 0:
+            raise ValueError(f"{attribute.name} must be non-negative: {value}")
+
+    def __attrs_post_init__(self):
+        if self.head + self.tail > MAX_OUTPUT_CHARS - MARKER_RESERVE:
+            raise ValueError(
+                f"head + tail exceeds output limit: {self.head} + {self.tail}")
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str]) -> "OutputLimits":
+        """Limits configured via $GHAPP_OUTPUT_HEAD/$GHAPP_OUTPUT_TAIL."""
+        limits = cls()
+        if environ.get(HEAD_ENV_VAR):
+            limits = attr.evolve(limits, head=int(environ[HEAD_ENV_VAR]))
+        if environ.get(TAIL_ENV_VAR):
+            limits = attr.evolve(limits, tail=int(environ[TAIL_ENV_VAR]))
+        return limits
+
+    def split(self, buf) -> Tuple[bytes, bytes, int]:
+        """Head and tail of buf, on character boundaries, and bytes dropped."""
+        size = len(buf)
+        if size <= self.head + self.tail:
+            return bytes(buf[:]), b"", 0
+
+        head_end = _utf8_boundary(buf, self.head)
+        tail_start = _utf8_boundary(buf, size - self.tail)
+
+        return bytes(buf[:head_end]), bytes(buf[tail_start:]), tail_start - head_end
+
+    def join(self, head: bytes, tail: bytes, dropped: int, source: str) -> str:
+        if not dropped:
+            return head.decode("utf-8", errors="replace")
+
+        logger.warning(
+            "Truncated output: %s, dropped %s bytes (%s kept from head, %s from tail)",
+            source, dropped, len(head), len(tail))
+
+        marker = f"\n\n... truncated {dropped} bytes ...\n\n"
+        return (head.decode("utf-8", errors="replace") + marker +
+                tail.decode("utf-8", errors="replace"))
+
+    def truncate(self, text: str) -> str:
+        """Truncate inline output to the limits."""
+        if len(text) <= self.head + self.tail:
+            return text
+        return self.join(*self.split(text.encode("utf-8")), source="<inline>")
+
+    def load(self, path: str) -> str:
+        """Read the head and tail of a file, without reading it in full."""
+        with open(path, "rb") as inf:
+            size = os.fstat(inf.fileno()).st_size
+            if size <= self.head + self.tail:
+                return inf.read(size).decode("utf-8", errors="replace")
+
+            with mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return self.join(*self.split(buf), source=path)
@@ -0,0 +1,211 @@
+"""Asynchronous processing of buildkite job events.
+
+Webhook handlers enqueue parsed events on bounded queues and return
+immediately, while a pool of workers applies them to github. Webhook latency
+is therefore independent of github api latency, and a burst of events
+exceeding the queues is rejected with `503`, for buildkite to redeliver,
+rather than stalling the server.
+
+Each job's events are queued to the same worker, by job id, so are applied
+serially and in order.
+
+Events are coalesced per job before being enqueued, as buildkite sends
+bursts of events for a job (scheduled, activated, started) which are
+superseded within milliseconds.
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import asyncio
+import logging
+import zlib
+
+import attr
+from aiohttp import web
+
+from .buildkite import jobs
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class JobEventPipeline:
+    """Apply job events with a pool of workers, each with its own queue.
+
+    `queue_size` events are queued in total, divided between the workers.
+    """
+    process: Callable[[jobs.JobHook], Awaitable]
+    queue_size: int = 1024
+    workers: int = 8
+
+    queues: List[asyncio.Queue] = attr.ib(factory=list, repr=False)
+    _tasks: List[asyncio.Task] = attr.ib(factory=list, repr=False)
+
+    enqueued: int = 0
+    dropped: int = 0
+    processed: int = 0
+    failed: int = 0
+
+    async def start(self, app: web.Application):
+        maxsize = max(-(-self.queue_size // self.workers), 1)
+        self.queues = [
+            asyncio.Queue(maxsize=maxsize) for _ in range(self.workers)
+        ]
+        self._tasks = [
+            asyncio.ensure_future(self._worker(queue)) for queue in self.queues
+        ]
+
+    async def stop(self, app: web.Application):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _queue(self, job_id: str) -> asyncio.Queue:
+        return self.queues[zlib.crc32(job_id.encode()) % len(self.queues)]
+
+    def accepts(self, hook: jobs.JobHook) -> bool:
+        """Check an event's queue has space, counting it as dropped if not."""
+        if self._queue(hook.job.id).full():
+            self.dropped += 1
+            logger.warning("Job event queue full, dropped: %s %s",
+                           hook.event.value, hook.job.id)
+            return False
+
+        return True
+
+    def submit(self, hook: jobs.JobHook) -> bool:
+        """Enqueue an event, returning False if its queue is full."""
+        try:
+            self._queue(hook.job.id).put_nowait(hook)
+        except asyncio.QueueFull:
+            logger.info("Job event queue full, deferring: %s %s",
+                        hook.event.value, hook.job.id)
+            return False
+
+        self.enqueued += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            hook = await queue.get()
+            try:
+                await self.process(hook)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Error processing job event: %s %s",
+                                 hook.event.value, hook.job.id)
+            finally:
+                queue.task_done()
+
+    async def join(self):
+        """Wait until all enqueued events are processed."""
+        await asyncio.gather(*(queue.join() for queue in self.queues))
+
+    def qsize(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def metrics(self) -> Dict[str, int]:
+        return dict(
+            queued=self.qsize(),
+            enqueued=self.enqueued,
+            dropped=self.dropped,
+            processed=self.processed,
+            failed=self.failed,
+        )
+
+
+TERMINAL_STATES = {
+    jobs.State.passed,
+    jobs.State.failed,
+    jobs.State.canceled,
+    jobs.State.skipped,
+    jobs.State.not_run,
+}
+
+
+@attr.s(auto_attribs=True)
+class JobEventCoalescer:
+    """Forward only the latest event for each job within a short window.
+
+    The first event for a job opens a `window` second delay, during which
+    later events replace it. Terminal events are forwarded immediately, and
+    late events for recently finished jobs discarded, so a finished check is
+    never reverted to in progress. Events which `forward` can't accept are
+    held, and forwarded again after `retry_delay` seconds.
+    """
+    forward: Callable[[jobs.JobHook], bool]
+    window: float = 0.5
+    retry_delay: float = 0.1
+    max_finished: int = 4096
+
+    pending: Dict[str, jobs.JobHook] = attr.ib(factory=dict, repr=False)
+    _timers: Dict[str, asyncio.Handle] = attr.ib(factory=dict, repr=False)
+    _finished: "OrderedDict[str, None]" = attr.ib(
+        factory=OrderedDict, repr=False)
+
+    received: int = 0
+    merged: int = 0
+    discarded: int = 0
+
+    @staticmethod
+    def is_terminal(hook: jobs.JobHook) -> bool:
+        return (hook.event == jobs.JobEvent.finished
+                or hook.job.state in TERMINAL_STATES)
+
+    def push(self, hook: jobs.JobHook):
+        self.received += 1
+        job_id = hook.job.id
+
+        if job_id in self._finished:
+            self.discarded += 1
+            logger.debug("Discarding event for finished job: %s %s",
+                         hook.event.value, job_id)
+            return
+
+        if job_id in self.pending:
+            self.merged += 1
+        self.pending[job_id] = hook
+
+        if self.is_terminal(hook):
+            self._finished[job_id] = None
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+
+            self.flush(job_id)
+        elif job_id not in self._timers:
+            self._timers[job_id] = asyncio.get_event_loop().call_later(
+                self.window, self.flush, job_id)
+
+    def flush(self, job_id: str):
+        timer = self._timers.pop(job_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        hook = self.pending.pop(job_id, None)
+        if hook is not None and not self.forward(hook):
+            self.pending[job_id] = hook
+            self._timers[job_id] = asyncio.get_event_loop().call_later(
+                self.retry_delay, self.flush, job_id)
+
+    async def stop(self, app: web.Application):
+        """Forward all pending events, dropping those which aren't accepted."""
+        for job_id in list(self.pending):
+            self.flush(job_id)
+
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+        if self.pending:
+            logger.warning("Dropping pending job events: %s", len(self.pending))
+            self.pending.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return dict(
+            received=self.received,
+            merged=self.merged,
+            discarded=self.discarded,
+            pending=len(self.pending),
+        )
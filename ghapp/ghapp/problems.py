@@ -0,0 +1,103 @@
+"""Problem matchers, parsing check run annotations from tool output.
+
+A matcher is a regular expression with named groups, applied to each line of
+compiler, linter or test output:
+
+    file (required), line (required), column, severity, code, message (required)
+
+Matched lines are lazily converted to `checks.Annotation`s, so arbitrarily
+large reports can be streamed to the checks api.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern
+
+import logging
+import os
+import re
+
+import attr
+
+from .github.checks import Annotation, AnnotationLevel
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ProblemMatcher:
+    pattern: Pattern
+    level: AnnotationLevel = AnnotationLevel.warning
+
+    SEVERITY_LEVELS = {
+        "note": AnnotationLevel.notice,
+        "info": AnnotationLevel.notice,
+        "notice": AnnotationLevel.notice,
+        "warning": AnnotationLevel.warning,
+        "error": AnnotationLevel.failure,
+        "fatal error": AnnotationLevel.failure,
+        "failure": AnnotationLevel.failure,
+    }
+
+    @classmethod
+    def resolve(cls, name_or_pattern: str) -> "ProblemMatcher":
+        """A builtin matcher by name, or a matcher for the given regex."""
+        if name_or_pattern in MATCHERS:
+            return MATCHERS[name_or_pattern]
+        return cls(pattern=re.compile(name_or_pattern))
+
+    def match(self, line: str, root: str = "") -> Optional[Annotation]:
+        """Annotation for a line of output, or None if it doesn't match."""
+        m = self.pattern.search(line)
+        if not m:
+            return None
+
+        groups = m.groupdict()
+        path = groups["file"]
+        if root and os.path.isabs(path):
+            path = os.path.relpath(path, root)
+
+        line_number = int(groups["line"])
+        column = int(groups["column"]) if groups.get("column") else None
+        severity = (groups.get("severity") or "").lower()
+        message = groups["message"].strip()
+        if groups.get("code"):
+            message = f"{groups['code']} {message}"
+
+        return Annotation(
+            path=path,
+            start_line=line_number,
+            end_line=line_number,
+            start_column=column,
+            end_column=column,
+            annotation_level=self.SEVERITY_LEVELS.get(severity, self.level),
+            message=message,
+        )
+
+
+MATCHERS: Dict[str, ProblemMatcher] = {
+    # gcc, clang & compatible: path:line:col: severity: message
+    "gcc": ProblemMatcher(pattern=re.compile(
+        r"^(?P<file>[^:\s][^:]*):(?P<line>\d+):(?:(?P<column>\d+):)?\s+"
+        r"(?P<severity>fatal error|error|warning|note):\s+(?P<message>.*)$")),
+    # flake8 & pycodestyle: path:line:col: code message
+    "flake8": ProblemMatcher(pattern=re.compile(
+        r"^(?P<file>[^:\s][^:]*):(?P<line>\d+):(?P<column>\d+):\s+"
+        r"(?P<code>[A-Z]+\d+)\s+(?P<message>.*)$")),
+}
+
+
+def parse_annotations(
+        lines: Iterable[str],
+        matchers: List[ProblemMatcher],
+        root: str = "",
+) -> Iterator[Annotation]:
+    """Lazily parse annotations from lines, via the first matching matcher.
+
+    Absolute paths are made relative to `root`, the repository checkout, if
+    provided.
+    """
+    for line in lines:
+        line = line.rstrip("\n")
+        for matcher in matchers:
+            annotation = matcher.match(line, root)
+            if annotation is not None:
+                yield annotation
+                break
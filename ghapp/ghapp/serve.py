@@ -0,0 +1,382 @@
+"""Pre-fork multi-process webhook server for `ghapp serve`.
+
+The master process binds the listening socket and forks worker processes,
+each running `Main.setup()` on its own event loop and accepting connections
+from the shared socket, so webhook ingestion scales across cores. Workers
+respond `503` to connections beyond their connection limit, shedding load
+rather than stalling.
+
+The master handles signals:
+
+    SIGHUP: Graceful reload. A new generation of workers is started,
+        re-resolving the app identity and webhook secrets, and the previous
+        generation is stopped once the new workers are serving.
+
+    SIGTERM, SIGINT: Graceful shutdown. Workers stop accepting connections,
+        complete in-flight requests and drain queued job events, within the
+        graceful timeout.
+
+Workers exiting unexpectedly are replaced.
+
+Workers don't share state: job event coalescing, delivery deduplication and
+the run and ETag caches are per worker. With more than one worker, a job's
+events may be handled by different workers, so absence of a run from the
+run index is never trusted, and the commit's runs listed before creating a
+run. A run created concurrently by another worker may still be duplicated.
+"""
+from typing import Callable, Dict, List, Optional, Set
+
+import asyncio
+import logging
+import os
+import select
+import signal
+import socket
+import time
+
+import attr
+from aiohttp import web
+
+from .app import Main
+from .github.identity import AppIdentity
+
+logger = logging.getLogger(__name__)
+
+# Exit status of a worker which failed before serving
+WORKER_BOOT_ERROR = 3
+
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n")
+
+
+def bind(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class _Overloaded(asyncio.Protocol):
+    def connection_made(self, transport):
+        transport.write(OVERLOADED_RESPONSE)
+        transport.close()
+
+
+class _Counted(asyncio.Protocol):
+    """Delegates to `protocol`, tracking its open connection."""
+
+    def __init__(self, protocol: asyncio.Protocol,
+                 connections: Set[asyncio.Protocol]):
+        self.protocol = protocol
+        self.connections = connections
+
+    def connection_made(self, transport):
+        self.connections.add(self)
+        self.protocol.connection_made(transport)
+
+    def connection_lost(self, exc):
+        self.connections.discard(self)
+        self.protocol.connection_lost(exc)
+
+    def data_received(self, data):
+        self.protocol.data_received(data)
+
+    def eof_received(self):
+        return self.protocol.eof_received()
+
+    def pause_writing(self):
+        self.protocol.pause_writing()
+
+    def resume_writing(self):
+        self.protocol.resume_writing()
+
+
+def limit_connections(server: web.Server,
+                      max_connections: int) -> Callable[[], asyncio.Protocol]:
+    """Protocol factory for `server`, rejecting connections beyond the limit."""
+    connections: Set[asyncio.Protocol] = set()
+
+    def factory():
+        if len(connections) >= max_connections:
+            logger.warning("Connection limit reached, rejecting connection.")
+            return _Overloaded()
+        return _Counted(server(), connections)
+
+    return factory
+
+
+async def serve_worker(
+        sock: socket.socket,
+        identity: Optional[AppIdentity],
+        max_connections: int,
+        graceful_timeout: float,
+        stopping: asyncio.Event,
+        ready: Callable[[], None] = lambda: None,
+        workers: int = 1,
+):
+    """Serve `Main` on a listening socket until `stopping` is set.
+
+    `workers` is the number of workers serving the socket.
+    """
+    loop = asyncio.get_event_loop()
+
+    main = Main.setup(identity=identity)
+    if workers > 1:
+        # Runs may have been created by other workers
+        main.run_index.complete_ttl = 0
+    runner = web.AppRunner(main.app)
+    await runner.setup()
+
+    server = await loop.create_server(
+        limit_connections(runner.server, max_connections), sock=sock)
+    logger.info("Worker serving: %s", os.getpid())
+    ready()
+
+    await stopping.wait()
+
+    # Stop accepting, then complete in-flight requests and queued events
+    server.close()
+    await server.wait_closed()
+    await runner.server.shutdown(graceful_timeout)
+
+    if main.pipeline is not None:
+        await main.coalescer.stop(main.app)
+        try:
+            await asyncio.wait_for(main.pipeline.join(), graceful_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping unprocessed job events: %s",
+                           main.pipeline.qsize())
+
+    await runner.shutdown()
+    await runner.cleanup()
+    logger.info("Worker stopped: %s", os.getpid())
+
+
+def _run_worker(
+        sock: socket.socket,
+        resolve_identity: Callable[[], Optional[AppIdentity]],
+        max_connections: int,
+        graceful_timeout: float,
+        ready_fd: int,
+        workers: int,
+) -> int:
+    """Worker process entry point, returning the exit status."""
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stopping = asyncio.Event()
+
+    # Interrupts are delivered to the process group, and handled by the master
+    loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    loop.add_signal_handler(signal.SIGINT, lambda: None)
+    loop.add_signal_handler(signal.SIGHUP, lambda: None)
+
+    booted = False
+
+    def ready():
+        nonlocal booted
+        booted = True
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+    try:
+        loop.run_until_complete(
+            serve_worker(sock, resolve_identity(), max_connections,
+                         graceful_timeout, stopping, ready, workers))
+    except Exception:
+        logger.exception("Worker failed: %s", os.getpid())
+        return 1 if booted else WORKER_BOOT_ERROR
+    finally:
+        loop.close()
+
+    return 0
+
+
+@attr.s(auto_attribs=True)
+class Worker:
+    pid: int
+    generation: int
+    ready_fd: int
+    ready: bool = False
+
+
+@attr.s(auto_attribs=True)
+class Master:
+    """Forks and supervises worker processes serving a listening socket."""
+    sock: socket.socket
+    resolve_identity: Callable[[], Optional[AppIdentity]]
+    workers: int = attr.Factory(lambda: os.cpu_count() or 1)
+    max_connections: int = 1024
+    graceful_timeout: float = 30
+
+    running: Dict[int, Worker] = attr.Factory(dict)
+    generation: int = 0
+    signals: List[int] = attr.Factory(list)
+    stopping: bool = False
+
+    def spawn(self, generation: int) -> Worker:
+        ready_read, ready_write = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            status = WORKER_BOOT_ERROR
+            try:
+                os.close(ready_read)
+                status = _run_worker(
+                    self.sock, self.resolve_identity, self.max_connections,
+                    self.graceful_timeout, ready_write, self.workers)
+            finally:
+                os._exit(status)
+
+        os.close(ready_write)
+        worker = Worker(pid=pid, generation=generation, ready_fd=ready_read)
+        self.running[pid] = worker
+        logger.info("Started worker: %s generation: %s", pid, generation)
+        return worker
+
+    def spawn_generation(self) -> int:
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn(self.generation)
+        return self.generation
+
+    def stop_generation(self, generation: int):
+        for worker in self.running.values():
+            if worker.generation == generation:
+                self.kill(worker, signal.SIGTERM)
+
+    def kill(self, worker: Worker, signum: int):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _read_ready(self, worker: Worker):
+        """Read a worker's ready notification, closing the pipe."""
+        worker.ready = os.read(worker.ready_fd, 1) == b"1"
+        os.close(worker.ready_fd)
+        worker.ready_fd = -1
+
+    def _wait_ready(self, timeout: float):
+        fds = {
+            w.ready_fd: w for w in self.running.values() if w.ready_fd >= 0
+        }
+        if not fds:
+            time.sleep(timeout)
+            return
+
+        readable, _, _ = select.select(list(fds), [], [], timeout)
+        for fd in readable:
+            self._read_ready(fds[fd])
+
+    def _reap(self) -> List[Worker]:
+        exited = []
+        while self.running:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+
+            worker = self.running.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.ready_fd >= 0:
+                self._read_ready(worker)
+
+            logger.info("Worker exited: %s status: %s", pid, status)
+            exited.append(worker)
+
+        return exited
+
+    def _signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def run(self) -> int:
+        """Run workers until shutdown, returning the exit status."""
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._signal)
+
+        # Generation serving requests, and generation starting on reload
+        current = self.spawn_generation()
+        pending = None
+        status = 0
+
+        while self.running:
+            self._wait_ready(0.2)
+
+            for worker in self._reap():
+                if self.stopping or worker.generation not in (current, pending):
+                    continue
+
+                if worker.ready:
+                    self.spawn(worker.generation)
+                elif worker.generation == pending:
+                    logger.error("Reload failed, worker failed to boot: %s",
+                                 worker.pid)
+                    self.stop_generation(pending)
+                    pending = None
+                else:
+                    logger.error("Worker failed to boot: %s", worker.pid)
+                    status = 1
+                    self.shutdown()
+
+            # Stop the previous generation once the reloaded workers serve
+            if pending is not None and all(
+                    w.ready for w in self.running.values()
+                    if w.generation == pending):
+                logger.info("Reloaded, stopping generation: %s", current)
+                self.stop_generation(current)
+                current, pending = pending, None
+
+            while self.signals:
+                signum = self.signals.pop(0)
+                if self.stopping:
+                    continue
+                if signum == signal.SIGHUP:
+                    logger.info("Reloading workers.")
+                    if pending is not None:
+                        self.stop_generation(pending)
+                    pending = self.spawn_generation()
+                else:
+                    self.shutdown()
+
+        return status
+
+    def shutdown(self):
+        logger.info("Shutting down workers.")
+        self.stopping = True
+        for worker in self.running.values():
+            self.kill(worker, signal.SIGTERM)
+
+
+def serve(
+        resolve_identity: Callable[[], Optional[AppIdentity]],
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        workers: Optional[int] = None,
+        max_connections: int = 1024,
+        graceful_timeout: float = 30,
+) -> int:
+    """Serve webhooks on host:port with pre-forked workers."""
+    sock = bind(host, port)
+    logger.info("Listening on: %s:%s", host, port)
+
+    master = Master(
+        sock=sock,
+        resolve_identity=resolve_identity,
+        max_connections=max_connections,
+        graceful_timeout=graceful_timeout,
+    )
+    if workers is not None:
+        master.workers = workers
+
+    try:
+        return master.run()
+    finally:
+        sock.close()
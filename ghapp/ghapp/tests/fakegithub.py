@@ -0,0 +1,196 @@
+"""A local stand-in for the github api, for tests and benchmarks.
+
+Implements the subset of the api used by ghapp: app installations,
+installation access tokens and check runs (listing with pagination, name
+filtering and ETags, create and update), with rate limit headers. Request
+latency and server error rates may be injected, and requests are counted by
+route to measure api usage.
+
+Point ghapp at a running instance via $GITHUB_API_URL.
+"""
+from collections import Counter
+from typing import Dict, List, Optional
+
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import time
+
+import attr
+from aiohttp import web
+
+
+@attr.s(auto_attribs=True)
+class FakeGithub:
+    installations: Dict[str, int] = attr.Factory(lambda: {"o": 1})
+
+    # Injected per-request latency, in seconds, and fraction of 502 responses
+    latency: float = 0
+    error_rate: float = 0
+    seed: Optional[int] = None
+
+    rate_limit: int = 5000
+    remaining: int = 5000
+
+    check_runs: List[dict] = attr.Factory(list)
+    calls: Counter = attr.Factory(Counter)
+
+    _random: random.Random = attr.ib(init=False, default=None)
+
+    def __attrs_post_init__(self):
+        self._random = random.Random(self.seed)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls = Counter()
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        route = request.match_info.route.name
+        self.calls[route] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if not request.headers.get("Authorization", "").startswith(
+                ("Bearer ", "token ")):
+            return web.json_response(
+                {"message": "Requires authentication"}, status=401)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response({"message": "Server Error"}, status=502)
+
+        resp = await handler(request)
+
+        if resp.status != 304:
+            self.remaining = max(self.remaining - 1, 0)
+        resp.headers["X-RateLimit-Limit"] = str(self.rate_limit)
+        resp.headers["X-RateLimit-Remaining"] = str(self.remaining)
+        resp.headers["X-RateLimit-Reset"] = str(int(time.time()) + 3600)
+
+        return resp
+
+    def application(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/app", self.get_app, name="app")
+        app.router.add_get(
+            "/app/installations", self.list_installations,
+            name="installations")
+        app.router.add_get(
+            "/users/{account}/installation", self.get_installation,
+            name="installation")
+        app.router.add_post(
+            "/app/installations/{id}/access_tokens", self.create_token,
+            name="access_tokens")
+        app.router.add_get(
+            "/repos/{owner}/{repo}/git/refs/heads/{branch}", self.get_ref,
+            name="ref")
+        app.router.add_get(
+            "/repos/{owner}/{repo}/commits/{ref}/check-runs",
+            self.list_check_runs, name="list_check_runs")
+        app.router.add_post(
+            "/repos/{owner}/{repo}/check-runs", self.create_check_run,
+            name="create_check_run")
+        app.router.add_patch(
+            "/repos/{owner}/{repo}/check-runs/{id}", self.update_check_run,
+            name="update_check_run")
+        return app
+
+    @staticmethod
+    def paginate(request: web.Request, items: list):
+        per_page = int(request.query.get("per_page", 30))
+        page = int(request.query.get("page", 1))
+        last = max(-(-len(items) // per_page), 1)
+
+        headers = {}
+        if last > 1:
+            headers["Link"] = (
+                f'<{request.url.with_query(per_page=per_page, page=last)}>;'
+                f' rel="last"')
+
+        return items[(page - 1) * per_page:page * per_page], headers
+
+    async def get_app(self, request):
+        return web.json_response({"id": 1, "name": "fake"})
+
+    async def list_installations(self, request):
+        installations = [
+            {"id": i, "account": {"login": account}}
+            for account, i in self.installations.items()
+        ]
+        page, headers = self.paginate(request, installations)
+        return web.json_response(page, headers=headers)
+
+    async def get_installation(self, request):
+        account = request.match_info["account"]
+        if account not in self.installations:
+            return web.json_response({"message": "Not Found"}, status=404)
+        return web.json_response(
+            {"id": self.installations[account], "account": {"login": account}})
+
+    async def create_token(self, request):
+        expires_at = (datetime.datetime.utcnow() +
+                      datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return web.json_response(
+            {"token": f"fake-{request.match_info['id']}",
+             "expires_at": expires_at},
+            status=201)
+
+    async def get_ref(self, request):
+        sha = hashlib.sha1(request.match_info["branch"].encode()).hexdigest()
+        return web.json_response({"object": {"sha": sha}})
+
+    def _runs(self, owner: str, repo: str) -> List[dict]:
+        return [
+            r for r in self.check_runs
+            if (r["owner"], r["repo"]) == (owner, repo)
+        ]
+
+    async def list_check_runs(self, request):
+        m = request.match_info
+        runs = [
+            r["run"] for r in self._runs(m["owner"], m["repo"])
+            if r["run"]["head_sha"] == m["ref"]
+        ]
+        if "check_name" in request.query:
+            runs = [r for r in runs if r["name"] == request.query["check_name"]]
+
+        page, headers = self.paginate(request, runs)
+        body = json.dumps({"total_count": len(runs), "check_runs": page})
+
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+        headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+
+        return web.Response(
+            text=body, content_type="application/json", headers=headers)
+
+    async def create_check_run(self, request):
+        m = request.match_info
+        body = await request.json()
+        if not body.get("head_sha") or not body.get("name"):
+            return web.json_response(
+                {"message": "Validation Failed"}, status=422)
+
+        run = dict(body, id=len(self.check_runs) + 1)
+        run.setdefault("status", "queued")
+        self.check_runs.append(dict(owner=m["owner"], repo=m["repo"], run=run))
+
+        return web.json_response(run, status=201)
+
+    async def update_check_run(self, request):
+        m = request.match_info
+        for r in self._runs(m["owner"], m["repo"]):
+            if str(r["run"]["id"]) == m["id"]:
+                body = await request.json()
+                body.pop("head_sha", None)
+                r["run"].update(body)
+                return web.json_response(r["run"])
+
+        return web.json_response({"message": "Not Found"}, status=404)
@@ -0,0 +1,66 @@
+from aiohttp import web
+
+from ...github import api
+from ...github.identity import AppIdentity
+
+
+async def test_authed_sessions(aiohttp_server, monkeypatch):
+    received = []
+
+    async def handler(req):
+        received.append(req.headers.get("Authorization"))
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = await aiohttp_server(app)
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    identity.token_cache.put("test", {
+        "token": "testtoken",
+        "expires_at": "2199-01-01T00:00:00Z"
+    })
+    monkeypatch.setattr(AppIdentity, "jwt", lambda self: "testjwt")
+
+    async with api.client_session() as session:
+        async with api.AppSession(session, identity).get(
+                server.make_url("/")) as resp:
+            assert resp.status == 200
+
+        installation = api.InstallationSession(session, identity, "test")
+        resp = await installation.get(
+            server.make_url("/"), headers={"Accept": "test"})
+        resp.release()
+
+        await session.get(server.make_url("/"))
+
+    assert received == ["Bearer testjwt", "token testtoken", None]
+
+
+async def test_rate_limit_retry(aiohttp_server, monkeypatch):
+    responses = [
+        web.Response(status=403, headers={"Retry-After": "0"}),
+        web.json_response({}, headers={
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "4999",
+            "X-RateLimit-Reset": "0",
+        }),
+    ]
+
+    async def handler(req):
+        return responses.pop(0)
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = await aiohttp_server(app)
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    monkeypatch.setattr(AppIdentity, "jwt", lambda self: "testjwt")
+
+    async with api.client_session() as session:
+        sesh = api.AppSession(session, identity)
+        async with sesh.get(server.make_url("/")) as resp:
+            assert resp.status == 200
+
+        assert sesh.rate_limit.remaining == 4999
+        assert identity.rate_limits.budget() == {None: 4999}
@@ -0,0 +1,43 @@
+import aiohttp
+from aiohttp import web
+
+from ...github import checks
+from ...github.urls import API_URL_ENV_VAR
+
+
+async def test_get_runs_paginated(aiohttp_server, monkeypatch):
+    runs = [dict(id=i, name=f"job {i % 3}") for i in range(250)]
+    requests = []
+
+    async def list_runs(req):
+        requests.append(dict(req.query))
+        per_page = int(req.query["per_page"])
+        page = int(req.query["page"])
+
+        matching = [
+            r for r in runs
+            if r["name"] == req.query.get("check_name", r["name"])
+        ]
+        return web.json_response({
+            "total_count": len(matching),
+            "check_runs": matching[(page - 1) * per_page:page * per_page],
+        })
+
+    app = web.Application()
+    app.router.add_get("/repos/o/r/commits/abc/check-runs", list_runs)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    async with aiohttp.ClientSession() as session:
+        result = await checks.GetRuns(owner="o", repo="r", ref="abc").execute(session)
+        assert [r.id for r in result] == [str(i) for i in range(250)]
+        assert sorted(int(r["page"]) for r in requests) == [1, 2, 3]
+        assert all(r["per_page"] == "100" for r in requests)
+
+        requests.clear()
+        result = await checks.GetRuns(
+            owner="o", repo="r", ref="abc", check_name="job 1").execute(session)
+        assert len(result) == 83
+        assert {r.name for r in result} == {"job 1"}
+        assert len(requests) == 1
+        assert requests[0]["check_name"] == "job 1"
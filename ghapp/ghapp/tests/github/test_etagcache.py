@@ -0,0 +1,56 @@
+import aiohttp
+from aiohttp import web
+
+from ...github import checks
+from ...github.etagcache import ETagCache
+from ...github.urls import API_URL_ENV_VAR
+
+
+async def test_get_runs_revalidated(aiohttp_server, monkeypatch):
+    runs = [dict(id=1, name="test", output=dict(title="t", summary="s"))]
+    requests = []
+
+    async def list_runs(req):
+        etag = f'"{len(runs)}"'
+        requests.append(req.headers.get("If-None-Match"))
+        if req.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        return web.json_response(
+            {"total_count": len(runs), "check_runs": runs},
+            headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_get("/repos/o/r/commits/abc/check-runs", list_runs)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    cache = ETagCache()
+    fetch = checks.GetRuns(owner="o", repo="r", ref="abc", cache=cache)
+
+    async with aiohttp.ClientSession() as session:
+        first = await fetch.execute(session)
+        assert await fetch.execute(session) == first
+        assert cache.stats() == dict(hits=1, misses=1, entries=1)
+
+        runs.append(dict(id=2, name="other"))
+        assert len(await fetch.execute(session)) == 2
+        assert cache.stats() == dict(hits=1, misses=2, entries=1)
+
+        # Filters are cached independently
+        await checks.GetRuns(
+            owner="o", repo="r", ref="abc", check_name="test",
+            cache=cache).execute(session)
+        assert cache.stats()["entries"] == 2
+
+    assert requests == [None, '"1"', '"1"', None]
+
+
+def test_lru_eviction():
+    cache = ETagCache(max_entries=2)
+    cache.put("a", "1", "a")
+    cache.put("b", "1", "b")
+    cache.put("a", "2", "a")
+    cache.put("c", "1", "c")
+
+    assert list(cache.entries) == ["a", "c"]
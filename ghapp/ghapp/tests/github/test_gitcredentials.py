@@ -1,6 +1,8 @@
 import pytest
 
-from ...github.gitcredentials import credential_helper
+from ...github import gitcredentials
+from ...github.gitcredentials import (
+    credential_helper, credential_erase, FileTokenCache)
 
 pytestmark = pytest.mark.asyncio
 
@@ -77,3 +79,81 @@ wat
     """.strip()
     with pytest.raises(ValueError):
         await credential_helper(invalid_input, test_token)
+
+
+def test_credential_erase():
+    evicted = []
+
+    credential_erase("""
+host=github.com
+protocol=https
+path=test/repo
+username=x-access-token
+password=testtoken
+    """.strip(), evicted.append)
+
+    credential_erase("""
+host=github.com
+protocol=https
+path=test2/repo
+username=user
+password=pass
+    """.strip(), evicted.append)
+
+    credential_erase("""
+host=github.com
+protocol=ssh
+    """.strip(), evicted.append)
+
+    assert evicted == ["test"]
+
+
+def test_file_token_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir))
+
+    fresh = {"token": "testtoken", "expires_at": "2199-01-01T00:00:00Z"}
+    expired = {"token": "expired", "expires_at": "2000-01-01T00:00:00Z"}
+
+    cache = FileTokenCache.for_app(1663)
+    assert cache.path == str(tmpdir.join("ghapp", "tokens-1663.json"))
+    assert cache.get("test") is None
+
+    cache.put("test", fresh)
+    cache.put("test2", expired)
+
+    # Tokens are shared with other processes via the cache file
+    other = FileTokenCache.for_app(1663)
+    assert other.get("test") == fresh
+    assert other.get("test2") is None
+    assert FileTokenCache.for_app(1664).get("test") is None
+
+    other.evict("test")
+    assert FileTokenCache.for_app(1663).get("test") is None
+
+
+def test_file_token_cache_reads(tmpdir, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir))
+    fresh = {"token": "testtoken", "expires_at": "2199-01-01T00:00:00Z"}
+
+    reads = []
+    locked = gitcredentials.locked_json
+
+    def locked_json(path, exclusive=True):
+        if not exclusive:
+            reads.append(path)
+        return locked(path, exclusive)
+
+    monkeypatch.setattr(gitcredentials, "locked_json", locked_json)
+
+    FileTokenCache.for_app(1663).put("test", fresh)
+
+    # Misses re-read the file only once it has changed
+    cache = FileTokenCache.for_app(1663)
+    assert cache.get("other") is None
+    assert cache.get("other") is None
+    assert cache.get("test") == fresh
+    assert len(reads) == 1
+
+    FileTokenCache.for_app(1663).put("other", fresh)
+    assert cache.get("other") == fresh
+    assert len(reads) == 2
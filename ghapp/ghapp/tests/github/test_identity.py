@@ -1,7 +1,9 @@
 import os
+import time
+import datetime
 import contextlib
 
-from ...github.identity import AppIdentity
+from ...github.identity import AppIdentity, TokenCache
 
 @contextlib.contextmanager
 def set_env(**environ):
@@ -66,3 +68,68 @@ sekrats
 
     # Test resolution of id from filenames
     i = AppIdentity(private_key = str(test_key_file), app_id = str(test_id_file))
+
+
+def test_token_cache():
+    cache = TokenCache(refresh_margin=60)
+
+    def token(name, expires_in):
+        expires_at = datetime.datetime.utcfromtimestamp(time.time() + expires_in)
+        return {
+            "token": name,
+            "expires_at": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+        }
+
+    assert cache.get("test") is None
+
+    cache.put("test", token("fresh", 3600))
+    cache.put("test2", token("expiring", 30))
+    cache.put("test3", token("expired", -30))
+
+    assert cache.get("test")["token"] == "fresh"
+    assert cache.get("test2") is None
+    assert cache.get("test3") is None
+    assert set(cache.tokens) == {"test"}
+
+    cache.evict("test")
+    assert cache.get("test") is None
+
+
+async def test_cached_installation_headers():
+    i = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+
+    i.token_cache.put("test", {
+        "token": "testtoken",
+        "expires_at": "2199-01-01T00:00:00Z"
+    })
+
+    assert (await i.installation_token_for("test"))["token"] == "testtoken"
+    assert (await i.installation_headers("test"))["Authorization"] == (
+        "token testtoken")
+
+
+def test_jwt_memoized(monkeypatch):
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    import jwt
+
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+    i = AppIdentity(app_id=1663, private_key=pem)
+
+    token = i.jwt()
+    assert i.jwt() == token
+    assert jwt.decode(
+        token, key.public_key(), algorithms=["RS256"])["iss"] == 1663
+
+    now = time.time()
+    monkeypatch.setattr(
+        time, "time", lambda: now + i.JWT_LIFETIME - i.JWT_REFRESH_MARGIN)
+    assert i.jwt() != token
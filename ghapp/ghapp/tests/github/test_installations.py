@@ -0,0 +1,84 @@
+import asyncio
+
+import aiohttp
+
+from ...github.api import AppSession
+from ...github.identity import AppIdentity
+from ...github.installations import InstallationIndex
+from ...github.urls import API_URL_ENV_VAR
+from ..fakegithub import FakeGithub
+
+
+def installation_event(action, login, id):
+    return {"action": action, "installation": {"id": id, "account": {"login": login}}}
+
+
+async def test_installation_hooks():
+    index = InstallationIndex(installations={"test": 1}, loaded=True)
+
+    await index.hook("installation", installation_event("created", "test2", 2))
+    await index.hook(
+        "installation_repositories", installation_event("added", "test3", 3))
+    assert index.installations == {"test": 1, "test2": 2, "test3": 3}
+
+    await index.hook("installation", installation_event("deleted", "test", 1))
+    await index.hook("installation", installation_event("suspend", "test3", 3))
+    assert index.installations == {"test2": 2}
+
+    assert await index.installation_id("test2", session=None) == 2
+
+
+async def test_removed_installation_evicts_token():
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    identity.installations.installations["test"] = 1
+    identity.installations.loaded = True
+    identity.token_cache.put(
+        "test", {"token": "t", "expires_at": "2099-01-01T00:00:00Z"})
+    assert identity.token_cache.get("test") is not None
+
+    await identity.installations.hook(
+        "installation", installation_event("deleted", "test", 1))
+    assert identity.token_cache.get("test") is None
+
+
+async def test_concurrent_refresh(monkeypatch):
+    index = InstallationIndex()
+    refreshes = []
+
+    async def refresh(session):
+        refreshes.append(session)
+        await asyncio.sleep(0.01)
+        index.installations = {"test": 1}
+        index.loaded = True
+
+    monkeypatch.setattr(index, "refresh", refresh)
+
+    ids = await asyncio.gather(
+        *(index.installation_id("test", session=None) for _ in range(4)))
+    assert ids == [1] * 4
+    assert len(refreshes) == 1
+
+
+async def test_missing_and_refreshed_installations(aiohttp_server, monkeypatch):
+    github = FakeGithub(installations={"o": 1})
+    server = await aiohttp_server(github.application())
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+    monkeypatch.setattr(AppIdentity, "jwt", lambda self: "testjwt")
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    index = identity.installations
+    index.refresh_interval = 300
+
+    async with aiohttp.ClientSession() as session:
+        sesh = AppSession(session, identity)
+
+        # Accounts without an installation are looked up once per ttl
+        for _ in range(3):
+            assert await index.installation_id("new", sesh) is None
+        assert github.calls == {"installations": 1, "installation": 1}
+
+        # New installations are found by the next listing
+        github.installations["new"] = 2
+        index.loaded_at -= 300
+        assert await index.installation_id("new", sesh) == 2
+        assert github.calls == {"installations": 2, "installation": 1}
@@ -0,0 +1,54 @@
+import time
+
+from ...github.ratelimit import RateLimit, RateLimits
+
+
+def headers(remaining, reset, limit=5000):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+    }
+
+
+def test_rate_limit():
+    now = time.time()
+
+    limit = RateLimit()
+    assert limit.delay(now) == 0
+    assert limit.spacing(now) == 0
+
+    # Ample budget, no spacing
+    assert not limit.update(200, headers(4000, now + 100))
+    assert limit.remaining == 4000
+    assert limit.delay(now) == 0
+    assert limit.spacing(now) == 0
+
+    # Below reserve, requests spaced over time to reset
+    assert not limit.update(200, headers(100, now + 100))
+    assert limit.spacing(now) == 1.0
+
+    # Responses without headers are counted, except not modified responses
+    assert not limit.update(200, {})
+    assert not limit.update(304, {})
+    assert limit.remaining == 99
+
+    # Exhausted, blocked until reset
+    assert limit.update(403, headers(0, now + 100))
+    assert limit.delay(now) == 100
+
+    # Secondary rate limit
+    limit = RateLimit()
+    assert limit.update(403, {"Retry-After": "30"})
+    assert 29 < limit.delay() <= 30
+
+    # Other forbidden responses are not rate limits
+    assert not RateLimit().update(403, headers(10, now + 100))
+
+
+def test_rate_limits():
+    limits = RateLimits()
+    limits["test"].update(200, headers(10, time.time()))
+    limits[None]
+
+    assert limits.budget() == {"test": 10, None: None}
@@ -0,0 +1,113 @@
+import aiohttp
+import pytest
+from aiohttp import web
+
+from ...github import checks
+from ...github.retry import RetryPolicy
+from ...github.urls import API_URL_ENV_VAR
+
+fast_retry = RetryPolicy(attempts=3, base_delay=0, deadline=5)
+
+
+def test_from_environ():
+    assert RetryPolicy.from_environ({}) == RetryPolicy()
+
+    policy = RetryPolicy.from_environ({
+        "GHAPP_RETRY_ATTEMPTS": "2",
+        "GHAPP_RETRY_DEADLINE": "1.5",
+    })
+    assert policy.attempts == 2
+    assert policy.deadline == 1.5
+
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= policy.max_delay
+
+
+async def test_create_retry_finds_existing_run(aiohttp_server, monkeypatch):
+    runs = []
+
+    async def create(req):
+        runs.append(dict(await req.json(), id=len(runs) + 1))
+        # The run was created, but the response was lost
+        return web.Response(status=502)
+
+    async def list_runs(req):
+        return web.json_response(
+            {"total_count": len(runs), "check_runs": runs})
+
+    app = web.Application()
+    app.router.add_post("/repos/o/r/check-runs", create)
+    app.router.add_get("/repos/o/r/commits/abc/check-runs", list_runs)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    action = checks.CreateRun(
+        owner="o",
+        repo="r",
+        run=checks.RunDetails(
+            name="test", head_sha="abc", head_branch="master",
+            external_id="job-1"))
+
+    async with aiohttp.ClientSession() as session:
+        run = await action.submit(session, fast_retry)
+
+    assert len(runs) == 1
+    assert run.id == "1"
+    assert run.external_id == "job-1"
+
+
+async def test_create_without_external_id_not_retried(aiohttp_server, monkeypatch):
+    posts = []
+
+    async def create(req):
+        posts.append(await req.json())
+        return web.Response(status=502)
+
+    app = web.Application()
+    app.router.add_post("/repos/o/r/check-runs", create)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    action = checks.CreateRun(
+        owner="o",
+        repo="r",
+        run=checks.RunDetails(name="test", head_sha="abc", head_branch="master"))
+
+    async with aiohttp.ClientSession() as session:
+        with pytest.raises(aiohttp.ClientResponseError):
+            await action.submit(session, fast_retry)
+
+    assert len(posts) == 1
+
+
+async def test_update_retry(aiohttp_server, monkeypatch):
+    statuses = [502, 503, 200]
+
+    async def update(req):
+        status = statuses.pop(0)
+        if status != 200:
+            return web.Response(status=status)
+        return web.json_response(dict(await req.json(), id=7))
+
+    app = web.Application()
+    app.router.add_patch("/repos/o/r/check-runs/7", update)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    action = checks.UpdateRun(
+        owner="o",
+        repo="r",
+        run=checks.RunDetails(
+            id="7", name="test", status=checks.Status.completed,
+            conclusion=checks.Conclusion.success))
+
+    async with aiohttp.ClientSession() as session:
+        run = await action.submit(session, fast_retry)
+        assert run.conclusion == checks.Conclusion.success
+        assert not statuses
+
+        # Client errors are not retried
+        statuses.extend([422, 200])
+        with pytest.raises(aiohttp.ClientResponseError):
+            await action.submit(session, fast_retry)
+        assert statuses == [200]
@@ -0,0 +1,67 @@
+import time
+
+from ...github.checks import RunDetails
+from ...github.runindex import RunIndex
+
+
+def check_run_event(app_id, run_id, external_id, sha="abc"):
+    return {
+        "action": "created",
+        "check_run": {
+            "id": run_id,
+            "name": "test",
+            "head_sha": sha,
+            "external_id": external_id,
+            "app": {"id": app_id},
+        },
+        "repository": {"name": "r", "owner": {"login": "o"}},
+    }
+
+
+async def test_run_index():
+    index = RunIndex(app_id=1663, max_commits=2)
+
+    assert index.resolve("o", "r", "abc", "job-1") == (None, False)
+
+    # Own responses are indexed, but absence unknown until a full listing
+    index.add("o", "r", "abc", RunDetails(name="a", id="1", external_id="job-1"))
+    assert index.resolve("o", "r", "abc", "job-1") == ("1", True)
+    assert index.resolve("o", "r", "abc", "job-2") == (None, False)
+
+    index.add_listing("o", "r", "abc", [
+        RunDetails(name="b", id="2", external_id="job-2"),
+        RunDetails(name="c", id="3"),
+    ])
+    assert index.resolve("o", "r", "abc", "job-2") == ("2", True)
+    assert index.resolve("o", "r", "abc", "job-3") == (None, True)
+
+    await index.hook("check_run", check_run_event(1663, 4, "job-4", sha="def"))
+    await index.hook("check_run", check_run_event(1, 5, "job-5", sha="def"))
+    assert index.resolve("o", "r", "def", "job-4") == ("4", True)
+    assert index.resolve("o", "r", "def", "job-5") == (None, False)
+
+    assert index.stats() == dict(hits=4, misses=3, commits=2)
+
+    # Least recently used commits are evicted
+    index.add("o", "r", "123", RunDetails(name="a", id="6", external_id="job-6"))
+    assert list(index.commits) == [("o", "r", "def"), ("o", "r", "123")]
+
+
+def test_run_index_complete_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    index = RunIndex(complete_ttl=60)
+    index.add_listing("o", "r", "abc", [
+        RunDetails(name="a", id="1", external_id="job-1")])
+    assert index.lookup("o", "r", "abc", "job-2") == (None, True)
+
+    # Absence expires, as the run may have been created since the listing
+    now += 61
+    assert index.lookup("o", "r", "abc", "job-2") == (None, False)
+    assert index.lookup("o", "r", "abc", "job-1") == ("1", True)
+
+    # Absence is never known without a ttl
+    index = RunIndex(complete_ttl=0)
+    index.add_listing("o", "r", "abc", [])
+    assert index.lookup("o", "r", "abc", "job-2") == (None, False)
@@ -61,3 +61,74 @@ def test_ignore_optional_none():
     assert custom.unstructure(Foo(1, 2, None, 4)) == dict(a=1, b=2, d=4)
     assert custom.unstructure(Foo(1, 2, 3, None)) == dict(
         a=1, b=2, c=3, d=None)
+
+
+def test_generated_hooks():
+    custom = cattr.Converter()
+
+    @ignore_optional_none(converter=custom)
+    @ignore_unknown_attribs(converter=custom)
+    @attr.s(auto_attribs=True)
+    class Inner:
+        x: int
+        y: Optional[str] = None
+
+    @ignore_optional_none(converter=custom)
+    @ignore_unknown_attribs(converter=custom)
+    @attr.s
+    class Outer:
+        inner = attr.ib(type=Inner)
+        raw = attr.ib()
+        items = attr.ib(type=Optional[list], default=None)
+
+    obj = {"inner": {"x": "1", "z": 0}, "raw": {"a": [1]}, "extra": None}
+    assert custom.structure(obj, Outer) == Outer(Inner(1), {"a": [1]})
+    assert obj == {"inner": {"x": "1", "z": 0}, "raw": {"a": [1]}, "extra": None}
+
+    with pytest.raises(TypeError):
+        custom.structure({"raw": None}, Outer)
+
+    assert custom.unstructure(Outer(Inner(1, "a"), None, [Inner(2)])) == dict(
+        inner=dict(x=1, y="a"), raw=None, items=[dict(x=2)])
+    assert custom.unstructure(Outer(Inner(1), 2)) == dict(
+        inner=dict(x=1), raw=2)
+
+
+def test_generated_hooks_private_and_subclass():
+    custom = cattr.Converter()
+
+    @ignore_optional_none(converter=custom)
+    @ignore_unknown_attribs(converter=custom)
+    @attr.s(auto_attribs=True)
+    class Foo:
+        _a: int
+        b: Optional[int] = None
+
+    @attr.s(auto_attribs=True)
+    class Bar(Foo):
+        c: Optional[int] = None
+        d: int = 0
+
+    # Private attributes are passed as their init argument
+    assert custom.structure({"_a": "1", "x": 0}, Foo) == Foo(1)
+
+    # Subclass attributes aren't dropped
+    assert custom.unstructure(Foo(1)) == dict(_a=1)
+    assert custom.unstructure(Bar(1, 2, None, 3)) == dict(_a=1, b=2, d=3)
+
+
+def test_wrapped_hooks():
+    custom = cattr.Converter()
+
+    @attr.s(auto_attribs=True)
+    class Foo:
+        a: Optional[int]
+
+    custom.register_structure_hook(Foo, lambda obj, cls: cls(obj["a"] + 1))
+    custom.register_unstructure_hook(Foo, lambda obj: dict(a=obj.a, b=None))
+    ignore_unknown_attribs(Foo, converter=custom)
+    ignore_optional_none(Foo, converter=custom)
+
+    # Existing non-default hooks are wrapped
+    assert custom.structure({"a": 1, "b": 2}, Foo) == Foo(2)
+    assert custom.unstructure(Foo(None)) == dict(b=None)
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = {
+    "aiohttp", "aiorun", "asyncio", "cattr", "cryptography", "giturlparse",
+    "jwt"
+}
+
+LOADED_MODULES = """
+import json, sys
+from ghapp.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+print(json.dumps(sorted({m.split(".")[0] for m in sys.modules})))
+"""
+
+
+def loaded_modules(*argv, stdin=""):
+    env = dict(
+        os.environ,
+        LC_ALL="C.UTF-8",
+        LANG="C.UTF-8",
+        GITHUB_APP_AUTH_ID="1663",
+        GITHUB_APP_AUTH_KEY="BEGIN RSA PRIVATE KEY",
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", LOADED_MODULES] + list(argv),
+        input=stdin.encode(),
+        stdout=subprocess.PIPE,
+        env=env,
+        cwd=os.path.join(os.path.dirname(__file__), "../.."),
+        check=True,
+    )
+    return set(json.loads(result.stdout.decode().splitlines()[-1]))
+
+
+def test_lazy_imports():
+    assert not HEAVY_MODULES & loaded_modules("--help")
+    assert not HEAVY_MODULES & loaded_modules("credential", "store")
+    assert not HEAVY_MODULES & loaded_modules(
+        "credential", "erase", stdin="host=github.com\nprotocol=https\n")
@@ -0,0 +1,47 @@
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from .. import client
+
+
+def serve_once(path, response: bytes):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+
+    def respond():
+        conn, _ = sock.accept()
+        with conn:
+            conn.makefile("rb").readline()
+            conn.sendall(response)
+        sock.close()
+
+    thread = threading.Thread(target=respond)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("response", [
+    b"",
+    b"not json\n",
+    json.dumps(dict(exit=1, stdout="", stderr="Invalid request\n",
+                    error="invalid_request")).encode() + b"\n",
+])
+def test_client_fallback(tmpdir, monkeypatch, response):
+    path = str(tmpdir.join("ghapp.sock"))
+    monkeypatch.setenv(client.SOCKET_ENV_VAR, path)
+    thread = serve_once(path, response)
+
+    execs = []
+    monkeypatch.setattr(
+        os, "execvp", lambda file, args: execs.append(args))
+
+    client.main(["check", "update", "o/r", "1", "test"])
+    thread.join()
+
+    # Protocol and daemon errors fall back to the full cli
+    assert execs == [["ghapp", "check", "update", "o/r", "1", "test"]]
@@ -0,0 +1,57 @@
+import asyncio
+
+from ..github.identity import AppIdentity
+from ..daemon import serve
+from ..client import daemon_request
+
+
+async def test_daemon(tmpdir, loop):
+    app = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    app.token_cache.put("test", {
+        "token": "testtoken",
+        "expires_at": "2199-01-01T00:00:00Z"
+    })
+
+    path = str(tmpdir.join("ghapp.sock"))
+    server = loop.create_task(serve(app, path))
+    while not tmpdir.join("ghapp.sock").exists():
+        await asyncio.sleep(.01)
+
+    async def request(argv, stdin=""):
+        return await loop.run_in_executor(
+            None, daemon_request,
+            dict(argv=argv, stdin=stdin, env={}, cwd=str(tmpdir)), path)
+
+    response = await request(
+        ["credential", "get"],
+        "host=github.com\nprotocol=https\npath=test/repo\n")
+    assert response == dict(
+        exit=0,
+        stdout=("host=github.com\nprotocol=https\npath=test/repo\n"
+                "username=x-access-token\npassword=testtoken\n"),
+        stderr="")
+
+    # Rejected credentials are evicted from the daemon's token cache
+    response = await request(
+        ["credential", "erase"],
+        "host=github.com\nprotocol=https\npath=test/repo\n"
+        "username=x-access-token\npassword=testtoken\n")
+    assert response == dict(exit=0, stdout="", stderr="")
+    assert app.token_cache.get("test") is None
+
+    response = await request(["check", "push"])
+    assert response["exit"] == 2
+    assert "Missing argument" in response["stderr"]
+
+    response = await request(["token", "test"])
+    assert response["exit"] == 2
+
+    # Requests beyond the default stream limit are accepted
+    response = await request(
+        ["check", "push"], stdin="x" * (1024 * 1024))
+    assert response["exit"] == 2
+    assert "error" not in response
+
+    server.cancel()
+    await asyncio.wait([server])
+    assert not tmpdir.join("ghapp.sock").exists()
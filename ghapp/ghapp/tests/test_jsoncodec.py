@@ -0,0 +1,60 @@
+import glob
+import json
+import os
+
+import pytest
+
+from .. import jsoncodec
+
+
+@pytest.mark.parametrize(
+    "codec", jsoncodec.available(), ids=lambda c: c.name)
+def test_codec_roundtrip(codec):
+    for path in glob.glob(os.path.dirname(__file__) + "/*.json"):
+        with open(path, "rb") as inf:
+            raw = inf.read()
+
+        # Decoding matches stdlib from bytes or str, and encoding roundtrips
+        expected = json.loads(raw.decode())
+        assert codec.loads(raw) == expected
+        assert codec.loads(raw.decode()) == expected
+        assert json.loads(codec.dumpb(expected).decode()) == expected
+
+    assert codec.dumpb({"url": "https://a/b", "name": "é"}).decode() in (
+        '{"url":"https://a/b","name":"é"}',
+        '{"url":"https://a/b","name":"\\u00e9"}',
+    )
+
+
+def test_select():
+    assert jsoncodec.select("json").name == "json"
+    assert jsoncodec.select().name == jsoncodec.available()[0].name
+    assert jsoncodec.available()[-1].name == "json"
+
+    with pytest.raises(ValueError):
+        jsoncodec.select("yaml")
+
+
+def test_select_imports_preferred_only(monkeypatch):
+    loaded = []
+
+    def loader(name, installed):
+        def load():
+            loaded.append(name)
+            if not installed:
+                raise ImportError(name)
+            return jsoncodec.Codec(name, json.loads, json.dumps)
+        return load
+
+    monkeypatch.setattr(jsoncodec, "CODECS", {
+        "a": loader("a", False),
+        "b": loader("b", True),
+        "c": loader("c", True),
+    })
+
+    assert jsoncodec.select().name == "b"
+    assert loaded == ["a", "b"]
+
+    loaded.clear()
+    assert jsoncodec.select("c").name == "c"
+    assert loaded == ["c"]
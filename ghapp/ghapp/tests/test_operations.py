@@ -0,0 +1,129 @@
+import json
+
+import aiohttp
+
+from .. import operations
+from ..github import checks
+from ..github.identity import AppIdentity
+from ..github.urls import API_URL_ENV_VAR
+from .fakegithub import FakeGithub
+
+
+async def test_check_apply(aiohttp_server, monkeypatch):
+    github = FakeGithub(check_runs=[dict(owner="o", repo="r", run=dict(
+        id=1, name="existing", external_id="job-1", head_sha="abc"))])
+    server = await aiohttp_server(github.application())
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+    monkeypatch.setattr(AppIdentity, "jwt", lambda self: "testjwt")
+
+    records = [
+        dict(repo="o/r", name="existing", external_id="job-1", head_sha="abc",
+             head_branch="master", status="completed", conclusion="success"),
+        dict(repo="o/r", name="new", head_sha="abc", head_branch="master",
+             status="in_progress"),
+        dict(repo="o/r", name="by id", id="1", status="queued"),
+        dict(repo="o/r", name="no sha"),
+        # Repeated runs update the runs created by earlier records
+        dict(repo="o/r", name="new", head_sha="abc", head_branch="master",
+             status="completed", conclusion="success"),
+        dict(repo="o/r", name="nine", external_id="job-9", head_sha="abc",
+             head_branch="master", status="in_progress"),
+        dict(repo="o/r", name="nine", external_id="job-9", head_sha="abc",
+             head_branch="master", status="completed", conclusion="failure"),
+    ]
+    lines = [json.dumps(r) + "\n" for r in records]
+    lines.insert(2, "\n")
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    async with aiohttp.ClientSession() as session:
+        results = {
+            r["line"]: r
+            async for r in operations.check_apply(
+                identity, session, lines, concurrency=4)
+        }
+
+    # One listing for the commit, shared between records
+    assert github.calls["list_check_runs"] == 1
+
+    assert results[1]["action"] == "update"
+    assert results[1]["run"]["id"] == "1"
+    assert results[1]["run"]["conclusion"] == "success"
+
+    assert results[2]["action"] == "create"
+
+    assert results[4]["action"] == "update"
+    assert results[4]["run"]["status"] == "queued"
+
+    assert results[5]["error"].startswith("ValueError")
+
+    assert results[6]["action"] == "update"
+    assert results[6]["run"]["id"] == results[2]["run"]["id"]
+
+    assert results[7]["action"] == "create"
+    assert results[8]["action"] == "update"
+    assert results[8]["run"]["id"] == results[7]["run"]["id"]
+
+    assert {results[2]["run"]["id"], results[7]["run"]["id"]} == {"2", "3"}
+    assert github.calls["create_check_run"] == 2
+
+    # Records for the same run are applied in order
+    assert [r["run"]["status"] for r in github.check_runs[1:]] == [
+        "completed", "completed"]
+    assert set(results) == {1, 2, 4, 5, 6, 7, 8}
+
+
+async def test_from_job_env(aiohttp_server, monkeypatch, tmpdir):
+    github = FakeGithub()
+    server = await aiohttp_server(github.application())
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+    monkeypatch.setattr(AppIdentity, "jwt", lambda self: "testjwt")
+
+    environ = dict(
+        CI="true",
+        BUILDKITE="true",
+        BUILDKITE_LABEL="test",
+        BUILDKITE_BRANCH="master",
+        BUILDKITE_COMMIT="abc",
+        BUILDKITE_REPO="https://github.com/o/r.git",
+        BUILDKITE_BUILD_ID="build-1",
+        BUILDKITE_BUILD_NUMBER="1",
+        BUILDKITE_BUILD_URL="https://buildkite.com/o/r/builds/1",
+        BUILDKITE_JOB_ID="job-1",
+        BUILDKITE_COMMAND="true",
+        BUILDKITE_TIMEOUT="false",
+        BUILDKITE_BUILD_CHECKOUT_PATH=str(tmpdir.join("r")),
+    )
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    async with aiohttp.ClientSession() as session:
+        await operations.check_from_job_env(identity, session, environ)
+        assert github.calls == {
+            "installations": 1,
+            "access_tokens": 1,
+            "list_check_runs": 1,
+            "create_check_run": 1,
+        }
+
+        # Post-command updates the recorded run directly
+        github.reset_calls()
+        result = await operations.check_from_job_env(
+            identity, session, dict(environ, BUILDKITE_COMMAND_EXIT_STATUS="0"))
+        assert github.calls == {"update_check_run": 1}
+
+    assert result["conclusion"] == "success"
+    assert [r["run"]["status"] for r in github.check_runs] == ["completed"]
+
+    # Annotations keep the run's current output
+    github.check_runs[0]["run"]["output"] = dict(
+        title="tests", summary="10 passed", text="log")
+    annotation = checks.Annotation(
+        path="a.py", start_line=1, end_line=1,
+        annotation_level=checks.AnnotationLevel.warning, message="problem")
+    async with aiohttp.ClientSession() as session:
+        await operations.check_from_job_env(
+            identity, session, dict(environ, BUILDKITE_COMMAND_EXIT_STATUS="0"),
+            annotations=[annotation])
+
+    output = github.check_runs[0]["run"]["output"]
+    assert (output["title"], output["summary"]) == ("tests", "10 passed")
+    assert len(output["annotations"]) == 1
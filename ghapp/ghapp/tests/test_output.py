@@ -0,0 +1,42 @@
+import pytest
+
+from ..output import OutputLimits, MAX_OUTPUT_CHARS
+from ..operations import load_job_output
+
+
+def test_load_bounded(tmpdir):
+    limits = OutputLimits(head=10, tail=10)
+
+    small = tmpdir.join("small.txt")
+    small.write("short output")
+    assert limits.load(str(small)) == "short output"
+
+    # Multi-byte characters straddle both cuts
+    large = tmpdir.join("large.txt")
+    large.write_text("head ééé" + "x" * 1000 + "ééé tail", encoding="utf-8")
+    loaded = limits.load(str(large))
+
+    head, tail = loaded.split("\n\n... truncated ")
+    assert head == "head éé"
+    assert tail.endswith(" bytes ...\n\nééé tail")
+    assert "�" not in loaded
+    assert tail.startswith("1002 bytes")
+
+    assert limits.truncate("ü" * 100).count("ü") == 10
+
+
+def test_default_limits(tmpdir):
+    log = tmpdir.join("log.txt")
+    log.write("\n".join(f"line {i}" for i in range(100000)))
+
+    output = load_job_output("title", str(log), str(log))
+    assert len(output.summary) <= MAX_OUTPUT_CHARS
+    assert output.text.startswith("line 0\n")
+    assert output.text.endswith("line 99999")
+
+    with pytest.raises(ValueError):
+        OutputLimits(head=MAX_OUTPUT_CHARS, tail=1)
+
+    assert OutputLimits.from_environ(
+        {"GHAPP_OUTPUT_HEAD": "100", "GHAPP_OUTPUT_TAIL": "200"}
+    ) == OutputLimits(head=100, tail=200)
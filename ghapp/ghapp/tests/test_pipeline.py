@@ -0,0 +1,160 @@
+import asyncio
+import copy
+import json
+import os
+
+import cattr
+
+from ..app import Main, BuildkiteHooks, GithubHooks
+from ..buildkite import jobs
+from ..pipeline import JobEventCoalescer, JobEventPipeline
+from ..github.identity import AppIdentity
+
+
+async def test_job_event_pipeline(aiohttp_client, monkeypatch):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, "github")
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, "buildkite")
+
+    applied = []
+    release = asyncio.Event()
+
+    async def apply_job(self, hook):
+        await release.wait()
+        applied.append(hook)
+
+    monkeypatch.setattr(Main, "apply_job", apply_job)
+
+    identity = AppIdentity(app_id=1663, private_key="BEGIN RSA PRIVATE KEY")
+    main = None
+
+    def setup(loop):
+        nonlocal main
+        main = Main.setup(loop=loop, identity=identity, coalesce_window=0)
+        main.pipeline.queue_size = 2
+        main.pipeline.workers = 1
+        return main.app
+
+    client = await aiohttp_client(setup)
+
+    with open(os.path.dirname(__file__) + "/buildkite.job.started.json") as inf:
+        event = json.load(inf)
+
+    # Events are accepted while processing is blocked, with events beyond the
+    # in-progress event and queue size rejected, and not recorded as delivered
+    for i in range(4):
+        event["job"]["id"] = f"job-{i}"
+        resp = await client.post(
+            "/webhooks/buildkite",
+            headers={
+                "X-Buildkite-Event": "job.started",
+                "X-Buildkite-Token": "buildkite",
+                "X-Buildkite-Request": f"delivery-{i}",
+                "content-type": "application/json",
+            },
+            data=json.dumps(event))
+        assert resp.status == (503 if i == 3 else 200), await resp.text()
+        await asyncio.sleep(0.01)
+
+    assert "delivery-3" not in main.buildkite_hooks.deliveries.entries
+    assert applied == []
+
+    release.set()
+    await main.pipeline.join()
+
+    assert main.pipeline.dropped == 1
+    assert len(applied) == 3
+    assert applied[0].event == jobs.JobEvent.started
+
+    resp = await client.get("/metrics")
+    metrics = await resp.json()
+    assert metrics["job_events"]["processed"] == len(applied)
+    assert metrics["job_events"]["dropped"] == main.pipeline.dropped
+    assert metrics["runs_cache"] == dict(hits=0, misses=0, entries=0)
+
+
+async def test_job_event_coalescing(loop):
+    with open(os.path.dirname(__file__) + "/buildkite.job.started.json") as inf:
+        event = json.load(inf)
+
+    def hook(job_id, event_name, state):
+        body = copy.deepcopy(event)
+        body["job"].update(id=job_id, state=state)
+        body["event"] = event_name
+        return cattr.structure(body, jobs.JobHook)
+
+    forwarded = []
+    accepting = True
+
+    def forward(hook):
+        if accepting:
+            forwarded.append(hook)
+        return accepting
+
+    coalescer = JobEventCoalescer(
+        forward=forward, window=0.05, retry_delay=0.05)
+
+    coalescer.push(hook("a", "job.scheduled", "scheduled"))
+    coalescer.push(hook("b", "job.scheduled", "scheduled"))
+    coalescer.push(hook("a", "job.started", "running"))
+    assert forwarded == []
+
+    # Terminal events flush immediately, superseding pending events
+    coalescer.push(hook("b", "job.finished", "passed"))
+    assert [(h.job.id, h.event) for h in forwarded] == [
+        ("b", jobs.JobEvent.finished)]
+
+    await asyncio.sleep(0.1)
+    assert [(h.job.id, h.event) for h in forwarded] == [
+        ("b", jobs.JobEvent.finished), ("a", jobs.JobEvent.started)]
+
+    # Late events for finished jobs are discarded
+    coalescer.push(hook("b", "job.started", "running"))
+    await asyncio.sleep(0.1)
+    assert len(forwarded) == 2
+
+    assert coalescer.metrics() == dict(
+        received=5, merged=2, discarded=1, pending=0)
+
+    # Events which aren't accepted are held and forwarded again
+    accepting = False
+    coalescer.push(hook("c", "job.finished", "passed"))
+    assert coalescer.pending
+
+    accepting = True
+    await asyncio.sleep(0.1)
+    assert forwarded[-1].job.id == "c"
+    assert not coalescer.pending
+
+
+async def test_job_event_order(loop):
+    with open(os.path.dirname(__file__) + "/buildkite.job.started.json") as inf:
+        event = json.load(inf)
+
+    applied = []
+    running = set()
+
+    async def process(hook):
+        assert hook.job.id not in running
+        running.add(hook.job.id)
+        await asyncio.sleep(0.01 if hook.event == jobs.JobEvent.started else 0)
+        running.remove(hook.job.id)
+        applied.append((hook.job.id, hook.event))
+
+    pipeline = JobEventPipeline(process=process, workers=4)
+    await pipeline.start(None)
+
+    # Each job's events are applied serially, in order, across workers
+    for job_id in "abcdef":
+        for name in ("job.started", "job.finished"):
+            body = copy.deepcopy(event)
+            body["job"]["id"] = job_id
+            body["event"] = name
+            assert pipeline.submit(cattr.structure(body, jobs.JobHook))
+
+    await pipeline.join()
+    await pipeline.stop(None)
+
+    for job_id in "abcdef":
+        assert [e for j, e in applied if j == job_id] == [
+            jobs.JobEvent.started, jobs.JobEvent.finished]
+    assert pipeline.metrics()["processed"] == 12
@@ -0,0 +1,85 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from ..github import checks
+from ..github.urls import API_URL_ENV_VAR
+from ..problems import ProblemMatcher, parse_annotations
+
+
+def test_parse_annotations():
+    lines = [
+        "/build/src/main.c:12:5: warning: unused variable 'x'\n",
+        "src/main.c:40: error: expected ';'\n",
+        "compiling...\n",
+        "ghapp/cli.py:7:1: F401 'os' imported but unused\n",
+        "TODO lib.py line 3: fix me\n",
+    ]
+    matchers = [
+        ProblemMatcher.resolve("gcc"),
+        ProblemMatcher.resolve("flake8"),
+        ProblemMatcher.resolve(
+            r"^TODO (?P<file>\S+) line (?P<line>\d+): (?P<message>.*)"),
+    ]
+
+    annotations = list(parse_annotations(lines, matchers, root="/build"))
+
+    assert [(a.path, a.start_line, a.start_column, a.annotation_level)
+            for a in annotations] == [
+                ("src/main.c", 12, 5, checks.AnnotationLevel.warning),
+                ("src/main.c", 40, None, checks.AnnotationLevel.failure),
+                ("ghapp/cli.py", 7, 1, checks.AnnotationLevel.warning),
+                ("lib.py", 3, None, checks.AnnotationLevel.warning),
+            ]
+    assert annotations[2].message == "F401 'os' imported but unused"
+    assert annotations[3].message == "fix me"
+
+
+async def test_upload_annotations(aiohttp_server, monkeypatch):
+    received = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def update(req):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        await asyncio.sleep(.01)
+        in_flight -= 1
+
+        body = await req.json()
+        received.append(body)
+        return web.json_response(dict(body, id=7))
+
+    app = web.Application()
+    app.router.add_patch("/repos/o/r/check-runs/7", update)
+    server = await aiohttp_server(app)
+    monkeypatch.setenv(API_URL_ENV_VAR, str(server.make_url("")))
+
+    consumed = 0
+
+    def annotations():
+        nonlocal consumed
+        for i in range(260):
+            consumed += 1
+            yield checks.Annotation(
+                path="a.py", start_line=i + 1, end_line=i + 1,
+                annotation_level=checks.AnnotationLevel.notice,
+                message=f"problem {i}")
+
+    upload = checks.UploadAnnotations(
+        owner="o", repo="r", run_id="7", name="test",
+        output=checks.Output(
+            title="lint", summary="lint results", text="x" * 60000),
+        concurrency=2)
+
+    async with aiohttp.ClientSession() as session:
+        count = await upload.submit(session, annotations())
+
+    assert count == consumed == 260
+    assert max_in_flight <= 2
+    assert sorted(len(r["output"]["annotations"]) for r in received) == [
+        10, 50, 50, 50, 50, 50]
+    assert all(r["output"]["title"] == "lint" for r in received)
+    assert not any("text" in r["output"] for r in received)
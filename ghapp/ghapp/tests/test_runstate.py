@@ -0,0 +1,19 @@
+from ..buildkite.runstate import RunState
+
+
+def test_run_state(tmpdir):
+    checkout = tmpdir.join("org", "pipeline")
+    state = RunState.for_checkout(str(checkout))
+    assert state.path == str(tmpdir.join("org", RunState.FILE_NAME))
+
+    assert state.get("job-1") is None
+    state.put("job-1", "101")
+    state.put("job-2", "102")
+    assert state.get("job-1") == "101"
+    assert RunState.for_checkout(str(checkout)).get("job-2") == "102"
+
+    # Stale entries are purged on write
+    expiring = RunState(path=state.path, max_age=-1)
+    expiring.put("job-3", "103")
+    assert state.get("job-1") is None
+    assert state.get("job-3") == "103"
@@ -0,0 +1,58 @@
+import asyncio
+
+from ..app import BuildkiteHooks, GithubHooks, Main
+from ..serve import bind, serve_worker
+
+
+async def test_serve_worker(monkeypatch):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, "github")
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, "buildkite")
+
+    mains = []
+    main_setup = Main.setup
+
+    def setup(**kwargs):
+        mains.append(main_setup(**kwargs))
+        return mains[-1]
+
+    monkeypatch.setattr(Main, "setup", setup)
+
+    sock = bind("127.0.0.1", 0)
+
+    stopping = asyncio.Event()
+    ready = asyncio.Event()
+    worker = asyncio.ensure_future(serve_worker(
+        sock, None, max_connections=1, graceful_timeout=1,
+        stopping=stopping, ready=ready.set, workers=2))
+    await ready.wait()
+
+    # Other workers may create runs, so absent runs are always listed
+    assert mains[0].run_index.complete_ttl == 0
+
+    async def get_zen():
+        reader, writer = await asyncio.open_connection(*sock.getsockname())
+        writer.write(b"GET /zen HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        status = (await reader.readline()).split()[1]
+        return status, writer
+
+    # Connections beyond the limit are rejected while one is kept alive
+    status, kept_alive = await get_zen()
+    assert status == b"200"
+    status, rejected = await get_zen()
+    assert status == b"503"
+
+    kept_alive.close()
+    rejected.close()
+
+    # Closed connections are no longer counted against the limit
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        status, accepted = await get_zen()
+        accepted.close()
+        if status == b"200":
+            break
+    assert status == b"200"
+
+    stopping.set()
+    await asyncio.wait_for(worker, 5)
+    sock.close()
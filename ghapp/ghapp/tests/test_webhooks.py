@@ -0,0 +1,248 @@
+import asyncio
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+from aiohttp import web
+
+from ..buildkite.webhooks import BuildkiteHooks
+from ..github.webhooks import GithubHooks
+from ..webhooks import DeliverySet
+
+
+def hooks_app(hooks, received):
+    async def record(name, body):
+        received.append((name, body))
+
+    hooks.signals.add_handler("ping", record)
+    hooks.signals.freeze()
+
+    app = web.Application()
+    app.router.add_post("/", hooks.handler)
+    return app
+
+
+def github_signature(body: bytes, digestmod: str) -> str:
+    mac = hmac.new(b"github", msg=body, digestmod=digestmod)
+    return f"{digestmod}=" + mac.hexdigest()
+
+
+async def test_github_hooks(aiohttp_client):
+    received = []
+    hooks = GithubHooks(secret="github", max_body_size=1024)
+    client = await aiohttp_client(hooks_app(hooks, received))
+
+    body = json.dumps({"zen": "Beautiful is better than ugly."}).encode()
+
+    async def post(data, content_type="application/json", **headers):
+        return await client.post(
+            "/", data=data,
+            headers=dict(headers, **{
+                "X-GitHub-Event": "ping",
+                "content-type": content_type,
+            }))
+
+    resp = await post(body, **{
+        "X-Hub-Signature-256": github_signature(body, "sha256")})
+    assert resp.status == 200, await resp.text()
+
+    resp = await post(body, **{"X-Hub-Signature": github_signature(body, "sha1")})
+    assert resp.status == 200, await resp.text()
+
+    # sha256 is verified in preference to sha1
+    resp = await post(body, **{
+        "X-Hub-Signature-256": github_signature(body + b" ", "sha256"),
+        "X-Hub-Signature": github_signature(body, "sha1"),
+    })
+    assert resp.status == 401
+
+    form = urlencode({"payload": body.decode()}).encode()
+    resp = await post(
+        form, "application/x-www-form-urlencoded",
+        **{"X-Hub-Signature-256": github_signature(form, "sha256")})
+    assert resp.status == 200, await resp.text()
+
+    assert received == [("ping", json.loads(body))] * 3
+
+    # Unsigned, oversized and invalid payloads are rejected
+    resp = await post(body)
+    assert resp.status == 401
+
+    large = json.dumps({"zen": "." * 1024}).encode()
+    resp = await post(large, **{
+        "X-Hub-Signature-256": github_signature(large, "sha256")})
+    assert resp.status == 413
+
+    resp = await post(b"{", **{
+        "X-Hub-Signature-256": github_signature(b"{", "sha256")})
+    assert resp.status == 400
+
+    assert len(received) == 3
+
+
+async def test_buildkite_hooks(aiohttp_client):
+    received = []
+    hooks = BuildkiteHooks(secret="buildkite", max_body_size=1024)
+    client = await aiohttp_client(hooks_app(hooks, received))
+
+    body = json.dumps({"event": "ping"}).encode()
+
+    def signature(timestamp, body):
+        mac = hmac.new(b"buildkite", f"{timestamp}.".encode() + body, "sha256")
+        return f"timestamp={timestamp},signature={mac.hexdigest()}"
+
+    async def post(data, **headers):
+        return await client.post(
+            "/", data=data,
+            headers=dict(headers, **{
+                "X-Buildkite-Event": "ping",
+                "content-type": "application/json",
+            }))
+
+    resp = await post(body, **{"X-Buildkite-Token": "buildkite"})
+    assert resp.status == 200, await resp.text()
+
+    now = int(time.time())
+    resp = await post(body, **{"X-Buildkite-Signature": signature(now, body)})
+    assert resp.status == 200, await resp.text()
+
+    assert received == [("ping", json.loads(body))] * 2
+
+    resp = await post(body)
+    assert resp.status == 401
+
+    resp = await post(body, **{"X-Buildkite-Token": "buildkit"})
+    assert resp.status == 401
+
+    resp = await post(body, **{
+        "X-Buildkite-Signature": signature(now, body + b" ")})
+    assert resp.status == 401
+
+    # Stale signatures are rejected
+    resp = await post(body, **{
+        "X-Buildkite-Signature": signature(now - 3600, body)})
+    assert resp.status == 401
+
+    resp = await post(b"." * 2048, **{"X-Buildkite-Token": "buildkite"})
+    assert resp.status == 413
+
+    assert len(received) == 2
+
+
+async def test_delivery_deduplication(aiohttp_client):
+    received = []
+    hooks = GithubHooks(secret="github")
+    client = await aiohttp_client(hooks_app(hooks, received))
+
+    body = json.dumps({"zen": "Beautiful is better than ugly."}).encode()
+
+    async def post(delivery, signature):
+        return await client.post(
+            "/", data=body,
+            headers={
+                "X-GitHub-Event": "ping",
+                "X-GitHub-Delivery": delivery,
+                "X-Hub-Signature-256": signature,
+                "content-type": "application/json",
+            })
+
+    # Invalid deliveries are not recorded
+    resp = await post("delivery-1", github_signature(b"", "sha256"))
+    assert resp.status == 401
+
+    for _ in range(3):
+        resp = await post("delivery-1", github_signature(body, "sha256"))
+        assert resp.status == 200
+    resp = await post("delivery-2", github_signature(body, "sha256"))
+    assert resp.status == 200
+
+    assert len(received) == 2
+    assert hooks.deliveries.stats() == dict(
+        hits=2, misses=3, entries=2, hit_rate=0.4)
+
+
+async def test_buildkite_delivery_deduplication(aiohttp_client):
+    received = []
+    hooks = BuildkiteHooks(secret="buildkite")
+    client = await aiohttp_client(hooks_app(hooks, received))
+
+    for delivery in ("request-1", "request-1", "request-2"):
+        resp = await client.post(
+            "/", data=json.dumps({"event": "ping"}),
+            headers={
+                "X-Buildkite-Event": "ping",
+                "X-Buildkite-Token": "buildkite",
+                "X-Buildkite-Request": delivery,
+                "content-type": "application/json",
+            })
+        assert resp.status == 200
+
+    assert len(received) == 2
+    assert hooks.deliveries.stats()["hits"] == 1
+
+
+async def test_concurrent_redelivery(aiohttp_client):
+    received = []
+    release = asyncio.Event()
+    failing = True
+    hooks = GithubHooks(secret="github")
+
+    async def process(name, body):
+        await release.wait()
+        if failing:
+            raise ValueError("processing failed")
+        received.append(body)
+
+    hooks.signals.add_handler("ping", process)
+    hooks.signals.freeze()
+    app = web.Application()
+    app.router.add_post("/", hooks.handler)
+    client = await aiohttp_client(app)
+
+    body = json.dumps({"zen": "Beautiful is better than ugly."}).encode()
+
+    def post():
+        return asyncio.ensure_future(client.post(
+            "/", data=body,
+            headers={
+                "X-GitHub-Event": "ping",
+                "X-GitHub-Delivery": "delivery-1",
+                "X-Hub-Signature-256": github_signature(body, "sha256"),
+                "content-type": "application/json",
+            }))
+
+    # Redeliveries of an in-progress delivery are acknowledged, unprocessed
+    first = post()
+    await asyncio.sleep(0.05)
+    resp = await post()
+    assert resp.status == 200
+    assert await resp.text() == "duplicate delivery"
+
+    # Failed deliveries are released for redelivery
+    release.set()
+    assert (await first).status == 500
+    assert "delivery-1" not in hooks.deliveries.entries
+
+    failing = False
+    resp = await post()
+    assert resp.status == 200
+    assert len(received) == 1
+
+
+def test_delivery_set():
+    deliveries = DeliverySet(max_entries=2)
+    for delivery in ("a", "b", "c"):
+        assert deliveries.reserve(delivery)
+    assert not deliveries.reserve("c")
+
+    # Oldest deliveries are evicted, and failed deliveries discarded
+    assert list(deliveries.entries) == ["b", "c"]
+    deliveries.discard("c")
+    assert deliveries.reserve("c")
+
+    # Deliveries expire after ttl
+    deliveries = DeliverySet(ttl=0)
+    deliveries.reserve("a")
+    assert deliveries.reserve("a")
+    assert list(deliveries.entries) == ["a"]
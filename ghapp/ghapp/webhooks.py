@@ -0,0 +1,143 @@
+"""Shared webhook request handling.
+
+Webhook bodies are read once, in chunks, updating the signature mac as the
+body is received. The same buffer is then decoded, so a delivery is never
+parsed before its signature is verified or held beyond the size limit.
+
+Redelivered webhooks are identified by their delivery id, and acknowledged
+without being processed again.
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+import hmac
+import logging
+import time
+
+import attr
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Github's maximum webhook payload size
+MAX_BODY_SIZE = 25 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_body(
+        req: web.Request,
+        mac: Optional["hmac.HMAC"] = None,
+        max_size: int = MAX_BODY_SIZE,
+) -> bytes:
+    """Read a request body, updating `mac` with the body as it is received.
+
+    Raises BodyTooLarge if the body, or its declared length, exceeds
+    `max_size` bytes.
+    """
+    if req.content_length is not None and req.content_length > max_size:
+        raise BodyTooLarge(req.content_length)
+
+    body = bytearray()
+    async for chunk in req.content.iter_chunked(CHUNK_SIZE):
+        if len(body) + len(chunk) > max_size:
+            raise BodyTooLarge(len(body) + len(chunk))
+        if mac is not None:
+            mac.update(chunk)
+        body.extend(chunk)
+
+    return bytes(body)
+
+
+def too_large(max_size: int) -> web.Response:
+    return web.Response(
+        status=413, text=f"body exceeds maximum size: {max_size}")
+
+
+@attr.s(auto_attribs=True)
+class DeliverySet:
+    """Recently processed webhook delivery ids.
+
+    Github and buildkite redeliver webhooks which time out, so a delivery may
+    arrive more than once, possibly while the first is still in progress.
+    Ids are reserved when processing starts, and held for `ttl` seconds, with
+    the oldest evicted beyond `max_entries`.
+    """
+    max_entries: int = 16384
+    ttl: float = 3600
+
+    entries: "OrderedDict[str, float]" = attr.ib(
+        factory=OrderedDict, repr=False)
+    hits: int = 0
+    misses: int = 0
+
+    def _expire(self, now: float):
+        while self.entries:
+            delivery_id, expires = next(iter(self.entries.items()))
+            if expires > now:
+                break
+            del self.entries[delivery_id]
+
+    def reserve(self, delivery_id: str) -> bool:
+        """Reserve a delivery for processing, False if already reserved.
+
+        Counts hits and misses.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if delivery_id in self.entries:
+            self.hits += 1
+            return False
+
+        self.misses += 1
+        self.entries[delivery_id] = now + self.ttl
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    def discard(self, delivery_id: str):
+        self.entries.pop(delivery_id, None)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        total = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self.entries),
+            hit_rate=self.hits / total if total else 0.0,
+        )
+
+
+def duplicate(delivery_id: str) -> web.Response:
+    logger.info("Ignoring duplicate delivery: %s", delivery_id)
+    return web.Response(status=200, text="duplicate delivery")
+
+
+async def process_once(
+        deliveries: DeliverySet,
+        delivery_id: Optional[str],
+        process: Callable[[], Awaitable[web.Response]],
+) -> web.Response:
+    """Process a delivery, unless it was already processed or is in progress.
+
+    The delivery id is released if the delivery is rejected or processing
+    fails, so a redelivery is processed.
+    """
+    if not delivery_id:
+        return await process()
+
+    if not deliveries.reserve(delivery_id):
+        return duplicate(delivery_id)
+
+    try:
+        resp = await process()
+    except BaseException:
+        deliveries.discard(delivery_id)
+        raise
+
+    if resp.status != 200:
+        deliveries.discard(delivery_id)
+    return resp
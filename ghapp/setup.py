@@ -17,6 +17,8 @@ setup(
             'ghapp.cli:credential',
         'ghapp='
             'ghapp.cli:main',
+        'ghapp-client='
+            'ghapp.client:main',
         ]
     },
     python_requires='>=3.6',
@@ -24,6 +26,10 @@ setup(
         open("requirements.txt").read()
     ],
 
+    extras_require={
+        "fast-json": ["orjson"],
+    },
+
     setup_requires=["pytest-runner"],
     tests_require=["pytest", "pytest-aiohttp"],
 )